@@ -20,7 +20,7 @@ import sys
 
 import click
 
-from byre import utils, setup
+from byre import utils
 from byre.clients.byr import ByrClient, ByrApi
 from byre.clients.tju import TjuPtClient, TjuPtApi
 from byre.commands.bt import BtCommand
@@ -65,6 +65,8 @@ MainCommand(bt, byr, tju).register(main)
 @main.command(name="setup")
 def setup_byre():
     """配置 byre、下载并配置 qBittorrent-nox。"""
+    from byre import setup
+
     setup.setup()
 
 
@@ -20,13 +20,14 @@ import time
 import typing
 from urllib.parse import urlparse
 
-import qbittorrentapi
-
 import byre.clients
 from byre import utils
 from byre.clients.data import LocalTorrent, TorrentInfo, TypedTorrent
 from byre.commands.config import GlobalConfig
 
+if typing.TYPE_CHECKING:
+    import qbittorrentapi
+
 _logger = logging.getLogger("byre.bt")
 _debug, _info, _warning, _fatal = (
     _logger.debug,
@@ -40,6 +41,8 @@ class BtClient:
     """对 qBittorrent 客户端的各种操作进行封装。"""
 
     def __init__(self, url: str) -> None:
+        import qbittorrentapi
+
         info = urlparse(url)
         scheme = info.scheme or "http"
         #: qBittorrent 连接。
@@ -155,13 +158,16 @@ class BtClient:
         - ``extra`` : 是共用文件的其它应同步删除的种子，会先删除这些种子（但不删除文件），
           然后再删除 ``torrent`` 并删除所有下载文件。
         """
-        if extra is not None:
+        # 大多数种子没有共用文件的种子，这时就不必发请求，也不必等待。
+        extra = list(extra) if extra is not None else []
+        if len(extra) != 0:
             _info(
                 "正在删除共用文件种子：\n%s", "\n".join(t.torrent.name for t in extra)
             )
             self.client.torrents_delete(
-                delete_files=False, torrent_hashes=(t.torrent.hash for t in extra)
+                delete_files=False, torrent_hashes=[t.torrent.hash for t in extra]
             )
+            # 等 qBittorrent 先把这些种子移除掉，再删除文件。
             time.sleep(0.5)
         _info("正在删除种子“%s”", torrent.torrent.name)
         self.client.torrents_delete(
@@ -198,7 +204,7 @@ class BtClient:
     @classmethod
     def local_torrent_from(
         cls,
-        torrent: qbittorrentapi.TorrentDictionary,
+        torrent: "qbittorrentapi.TorrentDictionary",
         site: typing.Optional[str] = None,
     ):
         t = TypedTorrent(torrent)
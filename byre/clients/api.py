@@ -22,6 +22,7 @@ from abc import ABCMeta, abstractmethod
 from urllib.parse import parse_qs, urlparse
 
 import bs4
+import soupsieve
 
 from byre.clients.client import NexusClient
 from byre.clients.data import (
@@ -56,6 +57,61 @@ class NexusSortableField(enum.Enum):
     UPLOADER = 9
 
 
+# 种子表格每一行都要用到的选择器，预先编译好。
+_DETAILS_LINK = soupsieve.compile("a[href^=details]")
+_USER_LINK = soupsieve.compile('a[href^=userdetails], a[href^="/userdetails"]')
+
+# noinspection SpellCheckingInspection
+_PROMOTION_MARKS = {
+    # 促销种子：高亮显示
+    ("tr", "free_bg"): TorrentPromotion.FREE,
+    ("tr", "twoup_bg"): TorrentPromotion.X2,
+    ("tr", "twoupfree_bg"): TorrentPromotion.FREE_X2,
+    ("tr", "halfdown_bg"): TorrentPromotion.HALF_OFF,
+    ("tr", "twouphalfdown_bg"): TorrentPromotion.HALF_OFF_X2,
+    ("tr", "thirtypercentdown_bg"): TorrentPromotion.THIRTY_PERCENT,
+    # 促销种子：添加标记，如'2X免费'
+    ("font", "free"): TorrentPromotion.FREE,
+    ("font", "twoup"): TorrentPromotion.X2,
+    ("font", "twoupfree"): TorrentPromotion.FREE_X2,
+    ("font", "halfdown"): TorrentPromotion.HALF_OFF,
+    ("font", "twouphalfdown"): TorrentPromotion.HALF_OFF_X2,
+    ("font", "thirtypercent"): TorrentPromotion.THIRTY_PERCENT,
+    # 促销种子：添加图标
+    ("img", "pro_free"): TorrentPromotion.FREE,
+    ("img", "pro_2up"): TorrentPromotion.X2,
+    ("img", "pro_free2up"): TorrentPromotion.FREE_X2,
+    ("img", "pro_50pctdown"): TorrentPromotion.HALF_OFF,
+    ("img", "pro_50pctdown2up"): TorrentPromotion.HALF_OFF_X2,
+    ("img", "pro_30pctdown"): TorrentPromotion.THIRTY_PERCENT,
+    # 促销种子：无标记 - 真的没办法
+}
+
+_TAG_MARKS = {
+    ("font", "hot"): TorrentTag.TRENDING,
+    ("font", "classic"): TorrentTag.CLASSIC,
+    ("font", "recommended"): TorrentTag.RECOMMENDED,
+}
+
+_M = typing.TypeVar("_M")
+
+
+def _find_mark(cell: bs4.Tag, marks: dict[tuple[str, str], _M]) -> typing.Optional[_M]:
+    """
+    在 ``cell`` 的子孙节点里找第一个（标签名, class）在 ``marks`` 里的节点。
+
+    相当于把一堆 ``tag.class`` 选择器合并成一次遍历，找到就停。
+    """
+    for element in cell.descendants:
+        if not isinstance(element, bs4.Tag):
+            continue
+        for css_class in element.attrs.get("class") or ():
+            mark = marks.get((element.name, css_class))
+            if mark is not None:
+                return mark
+    return None
+
+
 _LEVEL = "等级"
 _MANA = "魔力值"
 _INVITATIONS = "邀请"
@@ -234,8 +290,9 @@ class NexusApi(metaclass=ABCMeta):
         )
         title = next(iter(title_tag.children)).text.strip()
         subtitle = self._extract_page_subtitle(page)
-        cat, sec_cat = self._extract_page_categories(page)
-        size = self._extract_page_size(page)
+        basic_info = self._extract_page_basic_info(page)
+        cat, sec_cat = self._extract_page_categories(page, basic_info)
+        size = self._extract_page_size(page, basic_info)
         promotions = self._extract_promotion_info(title_tag)
         tag = self._extract_tag(title_tag)
         uploaded_at = self._extract_page_upload_time(page)
@@ -326,57 +383,19 @@ class NexusApi(metaclass=ABCMeta):
         """
         提取表格中的促销/折扣信息。
 
-        因为有很多种折扣信息的格式，总之暂时直接枚举。
+        因为有很多种折扣信息的格式，总之暂时直接枚举，见 ``_PROMOTION_MARKS`` 。
         """
-        # noinspection SpellCheckingInspection
-        selectors = {
-            # 促销种子：高亮显示
-            "tr.free_bg": TorrentPromotion.FREE,
-            "tr.twoup_bg": TorrentPromotion.X2,
-            "tr.twoupfree_bg": TorrentPromotion.FREE_X2,
-            "tr.halfdown_bg": TorrentPromotion.HALF_OFF,
-            "tr.twouphalfdown_bg": TorrentPromotion.HALF_OFF_X2,
-            "tr.thirtypercentdown_bg": TorrentPromotion.THIRTY_PERCENT,
-            # 促销种子：添加标记，如'2X免费'
-            "font.free": TorrentPromotion.FREE,
-            "font.twoup": TorrentPromotion.X2,
-            "font.twoupfree": TorrentPromotion.FREE_X2,
-            "font.halfdown": TorrentPromotion.HALF_OFF,
-            "font.twouphalfdown": TorrentPromotion.HALF_OFF_X2,
-            "font.thirtypercent": TorrentPromotion.THIRTY_PERCENT,
-            # 促销种子：添加图标
-            "img.pro_free": TorrentPromotion.FREE,
-            "img.pro_2up": TorrentPromotion.X2,
-            "img.pro_free2up": TorrentPromotion.FREE_X2,
-            "img.pro_50pctdown": TorrentPromotion.HALF_OFF,
-            "img.pro_50pctdown2up": TorrentPromotion.HALF_OFF_X2,
-            "img.pro_30pctdown": TorrentPromotion.THIRTY_PERCENT,
-            # 促销种子：无标记 - 真的没办法
-        }
-        for selector, promotions in selectors.items():
-            if title_cell.select_one(selector) is not None:
-                return promotions
-        return TorrentPromotion.NONE
+        return _find_mark(title_cell, _PROMOTION_MARKS) or TorrentPromotion.NONE
 
     @classmethod
     def _extract_tag(cls, title_cell: bs4.Tag) -> TorrentTag:
         """提取站点对种子打的标签。"""
-        selectors = {
-            "font.hot": TorrentTag.TRENDING,
-            "font.classic": TorrentTag.CLASSIC,
-            "font.recommended": TorrentTag.RECOMMENDED,
-        }
-        for selector, tag in selectors.items():
-            if title_cell.select_one(selector) is not None:
-                return tag
-        return TorrentTag.ANY
+        return _find_mark(title_cell, _TAG_MARKS) or TorrentTag.ANY
 
     @classmethod
     def _extract_user_from_a(cls, cell: bs4.Tag) -> NexusUser:
         user = NexusUser(cls.site())
-        user_cell = cell.select_one("a[href^=userdetails]") or cell.select_one(
-            'a[href^="/userdetails"]'
-        )
+        user_cell = _USER_LINK.select_one(cell)
         if user_cell is not None:
             user.user_id, user.username = (
                 cls.extract_url_id(user_cell.attrs["href"]),
@@ -391,14 +410,25 @@ class NexusApi(metaclass=ABCMeta):
         return not_none(page.select_one("#subtitle")).get_text(strip=True)
 
     @classmethod
-    def _extract_page_categories(cls, page: bs4.Tag) -> tuple[str, str]:
+    def _extract_page_basic_info(cls, page: bs4.Tag) -> dict[str, str]:
+        """
+        提取详情页里的“基本信息”之类的键值对。
+
+        有的站点把分类、大小等都塞在同一行里，在这里解析一次后交给各个 `_extract_page_*` 函数。
+        """
+        return {}
+
+    @classmethod
+    def _extract_page_categories(
+        cls, page: bs4.Tag, basic_info: dict[str, str]
+    ) -> tuple[str, str]:
         cat = not_none(page.select_one("span#type")).text.strip()
         sec_type = page.select_one("span#sec_type")
         sec_cat = sec_type.text.strip() if sec_type is not None else "其它"
         return cat, sec_cat
 
     @classmethod
-    def _extract_page_size(cls, page: bs4.Tag) -> float:
+    def _extract_page_size(cls, page: bs4.Tag, basic_info: dict[str, str]) -> float:
         return convert_iec_size(
             not_none(
                 not_none(not_none(page.select_one("span#type")).parent).find(
@@ -446,6 +476,9 @@ class NexusApi(metaclass=ABCMeta):
         提取二级分类、hash 等详情需要每个种子抓取一个页面，对服务器不太厚道。默认关闭。
         """
         torrents = []
+        # 每行都一样的东西就在循环外面算好。
+        site = self.site()
+        now = datetime.datetime.now()
         for row in rows:
             cells: bs4.element.ResultSet[bs4.Tag] = row.find_all("td", recursive=False)
             cells = self._rearrange_table_cells(cells)
@@ -498,11 +531,11 @@ class NexusApi(metaclass=ABCMeta):
             if uploader_cell is not None:
                 user = self._extract_user_from_a(cells[uploader_cell])
             else:
-                user = NexusUser(self.site())
+                user = NexusUser(site)
 
             # 标题需要一点特殊处理。
             title_cell = cells[1]
-            torrent_link = not_none(title_cell.select_one("a[href^=details]"))
+            torrent_link = not_none(_DETAILS_LINK.select_one(title_cell))
             if "title" in torrent_link.attrs:
                 title = torrent_link.attrs["title"]
             else:
@@ -531,7 +564,7 @@ class NexusApi(metaclass=ABCMeta):
 
             torrents.append(
                 TorrentInfo(
-                    site=self.site(),
+                    site=site,
                     title=title,
                     sub_title=subtitle,
                     seed_id=byr_id,
@@ -541,8 +574,7 @@ class NexusApi(metaclass=ABCMeta):
                     promotions=promotions,
                     tag=tag,
                     file_size=size,
-                    live_time=(datetime.datetime.now() - uploaded_at).total_seconds()
-                    / (60 * 60 * 24),
+                    live_time=(now - uploaded_at).total_seconds() / (60 * 60 * 24),
                     seeders=seeders,
                     leechers=leechers,
                     finished=finished,
@@ -558,7 +590,7 @@ class NexusApi(metaclass=ABCMeta):
 
     @classmethod
     def _extract_category(cls, cell: bs4.Tag) -> str:
-        return not_none(cell.select_one("img")).attrs["title"]
+        return cast(bs4.Tag, not_none(cell.find("img"))).attrs["title"]
 
     @classmethod
     def _extract_updated_at(
@@ -566,7 +598,9 @@ class NexusApi(metaclass=ABCMeta):
     ) -> datetime.datetime:
         return (
             datetime.datetime.fromisoformat(
-                not_none(cells[live_time_cell].select_one("span")).attrs["title"]
+                cast(bs4.Tag, not_none(cells[live_time_cell].find("span"))).attrs[
+                    "title"
+                ]
             )
             if live_time_cell is not None
             else datetime.datetime.now()
@@ -20,6 +20,7 @@ import typing
 from urllib.parse import quote
 
 import bs4
+import soupsieve
 from overrides import override
 
 from byre.clients.api import NexusApi, NexusSortableField
@@ -29,21 +30,15 @@ from byre.clients.data import TorrentInfo, TorrentPromotion, TorrentTag
 _logger = logging.getLogger("byre.clients.byr")
 _debug, _warning = _logger.debug, _logger.warning
 
+# 种子列表每一行都要用到的选择器，预先编译好。
+_TORRENT_ROWS = soupsieve.compile("table.torrents > tr")
+_UPLOAD_LINK = soupsieve.compile('a[href^="upload.php"]')
+_CATEGORY_LINK = soupsieve.compile(".cat-link")
+
 
 class ByrClient(NexusClient):
     """封装了 `requests.Session`，负责登录、管理会话、发起请求。"""
 
-    def __init__(
-        self,
-        username: str,
-        password: str,
-        cookie_file: str,
-        proxies: typing.Optional[dict[str, str]] = None,
-    ) -> None:
-        super().__init__(username, password, cookie_file, proxies)
-        #: 验证码自动识别模块（采用懒加载所以没有附上类型信息）。
-        self._decaptcha = None
-
     @classmethod
     @override
     def get_url(cls, path: str) -> str:
@@ -55,7 +50,6 @@ class ByrClient(NexusClient):
         self._session.cookies.clear()
 
         _debug("正在发起登录请求")
-        self._rate_limit()
         login_res = self._session.post(
             self.get_url("takelogin.php"),
             data={
@@ -89,7 +83,7 @@ class ByrApi(NexusApi):
     @classmethod
     @override
     def _rearrange_table_cells(cls, cells):
-        if cells[0].select_one('a[href^="upload.php"]') is not None:
+        if _UPLOAD_LINK.select_one(cells[0]) is not None:
             return cells[1:]
         else:
             return cells
@@ -97,7 +91,7 @@ class ByrApi(NexusApi):
     @classmethod
     @override
     def _extract_category(cls, cell: bs4.Tag) -> str:
-        link = cell.select_one(".cat-link")
+        link = _CATEGORY_LINK.select_one(cell)
         return (
             super()._extract_category(cell)
             if link is None
@@ -153,5 +147,5 @@ class ByrApi(NexusApi):
             + ("" if search is None else f"&search={quote(search)}")
         )
         return self._extract_torrent_table(
-            page_element.select("table.torrents > tr")[1:]
+            _TORRENT_ROWS.select(page_element)[1:]
         )
@@ -13,19 +13,57 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
 import os
-import pickle
+import random
+import threading
 import time
 import typing
 from abc import ABCMeta, abstractmethod
 
 import bs4
 import requests
+from requests.adapters import HTTPAdapter
 
 _logger = logging.getLogger("byre.clients.client")
 _debug, _info, _warning = _logger.debug, _logger.info, _logger.warning
 
+#: BeautifulSoup 用的 HTML 解析器，第一次解析页面时才确定。
+_html_parser: typing.Optional[str] = None
+
+
+def _get_html_parser() -> str:
+    """lxml 是 C 写的，比 html.parser 快得多，但不强制安装；用到时再看看装没装。"""
+    global _html_parser
+    if _html_parser is None:
+        try:
+            import lxml  # noqa: F401
+
+            _html_parser = "lxml"
+        except ImportError:
+            _html_parser = "html.parser"
+    return _html_parser
+
+#: 每个站点共用的 `HTTPAdapter` ，也就是 urllib3 的连接池。
+_adapters: dict[str, HTTPAdapter] = {}
+_adapters_lock = threading.Lock()
+
+
+def _shared_adapter(prefix: str) -> HTTPAdapter:
+    """
+    获取站点共用的连接池。
+
+    请求都是发往同一个站点的，连接池开大一点，并发请求时也能复用 TLS 连接；
+    同一进程里重新创建客户端（例如重新登录）时也不用重新握手。
+    """
+    with _adapters_lock:
+        adapter = _adapters.get(prefix)
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _adapters[prefix] = adapter
+        return adapter
+
 
 class NexusClient(metaclass=ABCMeta):
     """
@@ -49,12 +87,35 @@ class NexusClient(metaclass=ABCMeta):
         self.password = password
         #: 登录会话的 Cookies 缓存文件。
         self._cookie_file = cookie_file
-        #: 最后一次请求的时间（秒），用于全局限流。
-        self._last_requested_at = 0.0
-        #: 最大请求频率。
+        #: 最大请求频率（每秒补充的令牌数）。
         self._request_freq = request_frequency
+        #: 令牌桶容量，也即允许连续突发的请求数。
+        self._capacity = max(1.0, request_frequency)
+        #: 令牌桶里当前的令牌数，用于全局限流。
+        self._tokens = self._capacity
+        #: 上一次补充令牌的时间（`time.monotonic` 秒）。
+        self._last_refill = time.monotonic()
+        #: 令牌桶的锁，多线程并发请求时共用一个桶。
+        self._bucket_lock = threading.Lock()
+        #: 登录的锁，多个线程同时发现会话过期时只让一个线程去重新登录。
+        self._login_lock = threading.Lock()
+        #: 会话的代数，每次登录后加一，用来判断会话是不是已经被其它线程刷新过了。
+        self._session_generation = 0
         #: 会话。
         self._session = requests.Session()
+        # 同一站点的客户端共用一个连接池，Cookies 还是各自会话管理。
+        self._session.mount(self.get_url(""), _shared_adapter(self.get_url("")))
+        # requests 每次请求都会重新读一遍环境变量里的代理、CA 证书，还会去找 .netrc 文件，
+        # 这里在创建会话时解析一次就够了。
+        # 关掉 `trust_env` 之后 .netrc 里的认证信息也不会再用了（站点登录只靠 Cookies，用不上），
+        # 会话创建之后再改环境变量也不会生效。
+        self._session.proxies.update(
+            requests.utils.get_environ_proxies(self.get_url(""))
+        )
+        self._session.verify = (
+            os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE") or True
+        )
+        self._session.trust_env = False
         if proxies is not None:
             self._session.proxies.update(proxies)
         self._session.headers.update(
@@ -84,37 +145,72 @@ class NexusClient(metaclass=ABCMeta):
 
     def login(self, cache: bool = True) -> None:
         """登录，获取 Cookies。"""
+        with self._login_lock:
+            self._login(cache)
+
+    def _login(self, cache: bool) -> None:
+        """登录的实际实现，调用时需要持有 `self._login_lock` 。"""
         if cache and self._update_session_from_cache():
             _info("成功从缓存中获取会话")
+            self._session_generation += 1
             return
 
         self._rate_limit()
         self._authorize_session()
-        self._request_finished()
         _info("成功登录")
+        self._session_generation += 1
         self._cache_session()
 
+    def _relogin(self, generation: int) -> None:
+        """
+        会话过期时重新登录。
+
+        `generation` 是发起请求时的会话代数：如果其它线程已经重新登录过了，
+        就不用再登录一次（北邮人有封 IP 机制），直接用新的 Cookies 重试即可。
+        """
+        with self._login_lock:
+            if generation != self._session_generation:
+                _debug("会话已被其它线程刷新")
+                return
+            self._login(cache=False)
+
     def get(self, path: str, retries: int = 3, allow_redirects: bool = False):
         """使用当前会话发起请求，返回 `requests.Response`。"""
         _debug("正在请求 %s", path or "/")
+        url = self.get_url(path)
         for i in range(retries):
             self._rate_limit()
-            res = self._session.get(self.get_url(path), allow_redirects=allow_redirects)
-            self._request_finished()
+            # 其它线程正在登录的话先等它登录完，免得带着被清空的 Cookies 发请求。
+            with self._login_lock:
+                generation = self._session_generation
+            res = self._session.get(url, allow_redirects=allow_redirects)
 
             if res.status_code == 200:
                 # 未登录的话大多时候会是重定向。
                 return res
-            if retries > 1 and i == 0 and not self.is_logged_in():
-                self.login(cache=False)
+            if retries > 1 and i == 0 and res.is_redirect:
+                # 被重定向基本就是 Cookies 过期了，直接重新登录，
+                # 不用再额外发一个 `is_logged_in` 请求确认。
+                _debug("请求被重定向到 %s，重新登录", res.headers.get("Location"))
+                self._relogin(generation)
             if i != retries - 1:
                 _info("第 %d 次请求失败，正在重试（%s）", i + 1, path)
+                # 指数退避，加上随机抖动免得每次重试都卡在同样的时间点上。
+                time.sleep(2**i / self._request_freq * random.uniform(0.5, 1.5))
         raise ConnectionError(f"所有 {retries} 次请求均失败")
 
     def get_soup(self, path: str, retries: int = 3):
         """使用当前会话发起请求，返回 `bs4.BeautifulSoup`。"""
         res = self.get(path, retries=retries)
-        return bs4.BeautifulSoup(res.content, "html.parser")
+        # 响应头里声明了编码的话就直接告诉 BeautifulSoup，省得它再去猜。
+        encoding = (
+            res.encoding
+            if "charset" in res.headers.get("Content-Type", "").lower()
+            else None
+        )
+        return bs4.BeautifulSoup(
+            res.content, _get_html_parser(), from_encoding=encoding
+        )
 
     def is_logged_in(self) -> bool:
         """随便发起一个请求看看会不会被重定向到登录页面。"""
@@ -125,26 +221,33 @@ class NexusClient(metaclass=ABCMeta):
             return False
 
     def close(self) -> None:
-        """关闭 `requests.Session` 资源。"""
+        """关闭 `requests.Session` 资源（站点共用的连接池留给其它客户端继续用）。"""
+        self._session.adapters.pop(self.get_url(""), None)
         self._session.close()
 
     def _update_session_from_cache(self) -> bool:
         """从缓存文件里获取 Cookies，如果登录信息有效则返回 `True`。"""
-        if os.path.exists(self._cookie_file):
+        try:
             with open(self._cookie_file, "rb") as file:
-                cookies = pickle.load(file)
-                if not isinstance(cookies, dict) or any(
-                    key not in cookies for key in ["username", "cookies"]
-                ):
-                    _warning("缓存文件格式错误")
-                    return False
-                if cookies.get("username", "") != self.username:
-                    _debug("前登录用户与当前用户不符")
-                    return False
-                self._session.cookies.clear()
-                self._session.cookies.update(cookies["cookies"])
-                return True
-        return False
+                content = file.read()
+        except FileNotFoundError:
+            return False
+        try:
+            cookies = json.loads(content)
+        except ValueError:
+            # 包括旧版本用 pickle 保存的缓存：不再反序列化 pickle，重新登录后会被覆盖成 JSON。
+            cookies = None
+        if not isinstance(cookies, dict) or any(
+            key not in cookies for key in ["username", "cookies"]
+        ):
+            _warning("缓存文件格式错误")
+            return False
+        if cookies.get("username", "") != self.username:
+            _debug("前登录用户与当前用户不符")
+            return False
+        self._session.cookies.clear()
+        self._session.cookies.update(cookies["cookies"])
+        return True
 
     def _cache_session(self) -> None:
         """保存 `self._session.cookies`。"""
@@ -153,15 +256,32 @@ class NexusClient(metaclass=ABCMeta):
             "cookies": self._session.cookies.get_dict(),
         }
         path = os.path.dirname(self._cookie_file) or os.path.curdir
-        if not os.path.exists(path):
-            os.makedirs(path)
-        with open(self._cookie_file, "wb") as file:
-            pickle.dump(cookies, file)
+        os.makedirs(path, exist_ok=True)
+        with open(self._cookie_file, "w", encoding="utf-8") as file:
+            json.dump(cookies, file)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._last_refill) * self._request_freq,
+        )
+        self._last_refill = now
 
     def _rate_limit(self):
-        passed = time.time() - self._last_requested_at
-        if passed < 1.0 / self._request_freq:
-            time.sleep(1.0 / self._request_freq - passed)
+        """
+        令牌桶限流：每次请求消耗一个令牌，没有令牌了才需要等待。
 
-    def _request_finished(self):
-        self._last_requested_at = time.time()
+        长期来看请求频率不会超过 ``request_frequency`` ，但允许短时间内的突发请求
+        （例如抓完列表马上抓几个详情页）不必一个一个地排队等待。
+        """
+        with self._bucket_lock:
+            self._refill()
+            # 先把令牌预定下来（可以欠成负数），排在后面的线程就会等得更久一些。
+            self._tokens -= 1.0
+            deficit = -self._tokens
+        # 在锁外面睡，免得把其它线程也一起堵住。
+        if deficit > 0.0:
+            # ±10% 的随机抖动，平均下来的频率不变。
+            delay = deficit / self._request_freq
+            time.sleep(delay * random.uniform(0.9, 1.1))
@@ -16,16 +16,22 @@
 """北邮人 PT 站的用户、种子等信息。"""
 
 import enum
+import sys
 import time
 import typing
 from dataclasses import dataclass
 
-import qbittorrentapi
-
 from byre.utils import cast
 
+if typing.TYPE_CHECKING:
+    # qbittorrentapi 导入很慢（会拉上 pkg_resources），这里只用来标注类型。
+    import qbittorrentapi
+
+#: 每页种子都会创建一堆数据类，用 ``__slots__`` 省掉 ``__dict__`` （``slots`` 参数需要 Python 3.10）。
+_SLOTS: dict[str, typing.Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 
-@dataclass
+@dataclass(**_SLOTS)
 class NexusUser:
     """一位 NexusPHP 站点用户。"""
 
@@ -91,6 +97,13 @@ PROMOTION_TWO_UP = "two_up"
 
 PROMOTION_FREE = "free"
 
+_PROMOTION_TEXTS = {
+    PROMOTION_FREE: "免费",
+    PROMOTION_TWO_UP: "2x上传",
+    PROMOTION_HALF_DOWN: "50%下载",
+    PROMOTION_THIRTY_DOWN: "30%下载",
+}
+
 
 class TorrentPromotion(enum.Enum):
     """
@@ -109,9 +122,9 @@ class TorrentPromotion(enum.Enum):
     THIRTY_PERCENT = (PROMOTION_THIRTY_DOWN,), 7
 
     def __contains__(self, item) -> bool:
-        if self == TorrentPromotion.ANY:
+        if self is TorrentPromotion.ANY:
             return True
-        return item in self.get_promotions()
+        return item in _PROMOTION_SETS[self]
 
     def get_promotions(self) -> typing.Iterable[str]:
         return self.value[0]
@@ -120,13 +133,10 @@ class TorrentPromotion(enum.Enum):
         return self.value[1]
 
     def __str__(self) -> str:
-        texts = {
-            PROMOTION_FREE: "免费",
-            PROMOTION_TWO_UP: "2x上传",
-            PROMOTION_HALF_DOWN: "50%下载",
-            PROMOTION_THIRTY_DOWN: "30%下载",
-        }
-        return ", ".join(texts[p] for p in self.get_promotions()) or "无"
+        return ", ".join(_PROMOTION_TEXTS[p] for p in self.get_promotions()) or "无"
+
+
+_PROMOTION_SETS = {p: frozenset(p.get_promotions()) for p in TorrentPromotion}
 
 
 class TorrentTag(enum.Enum):
@@ -156,7 +166,7 @@ class UserTorrentKind(enum.Enum):
     INCOMPLETE = 5
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class TorrentInfo:
     """从北邮人上抓取来的种子信息。"""
 
@@ -233,9 +243,11 @@ class TypedTorrent:
     对应类型请见 https://github.com/qbittorrent/qBittorrent/wiki/WebUI-API-(qBittorrent-4.1)#get-torrent-list 。
     """
 
-    torrent: qbittorrentapi.TorrentDictionary
+    __slots__ = ("torrent",)
+
+    torrent: "qbittorrentapi.TorrentDictionary"
 
-    def __init__(self, torrent: qbittorrentapi.TorrentDictionary):
+    def __init__(self, torrent: "qbittorrentapi.TorrentDictionary"):
         self.torrent = torrent
 
     @property
@@ -298,6 +310,10 @@ class TypedTorrent:
     def tags(self):
         return cast(str, self.torrent.tags)
 
+    @property
+    def total_size(self):
+        return cast(int, self.torrent.total_size)
+
     @property
     def uploaded(self):
         return cast(int, self.torrent.uploaded)
@@ -311,7 +327,7 @@ class TypedTorrent:
         return cast(int, self.torrent.uploaded_session)
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class LocalTorrent:
     torrent: TypedTorrent
     """本地 qBittorrent 管理的种子。"""
@@ -325,10 +341,16 @@ class LocalTorrent:
     info: typing.Optional[TorrentInfo]
     """种子在北邮人上的信息。"""
 
-    def estimate_info(self) -> TorrentInfo:
-        """从本地信息估计种子信息。"""
+    def estimate_info(self, now: typing.Optional[float] = None) -> TorrentInfo:
+        """
+        从本地信息估计种子信息。
+
+        批量估计时可以传入同一个 ``now`` （`time.time` 秒），不用每个种子都取一次当前时间。
+        """
         if self.info is not None:
             return self.info
+        if now is None:
+            now = time.time()
         return TorrentInfo(
             self.site,
             title=self.torrent.name,
@@ -340,7 +362,7 @@ class LocalTorrent:
             promotions=TorrentPromotion.NONE,
             tag=TorrentTag.ANY,
             file_size=self.torrent.size,
-            live_time=(time.time() - self.torrent.last_activity) / (24 * 60 * 60),
+            live_time=(now - self.torrent.last_activity) / (24 * 60 * 60),
             seeders=self.torrent.num_complete,
             leechers=self.torrent.num_incomplete,
             finished=0,
@@ -15,10 +15,12 @@
 
 import datetime
 import logging
+import re
 import typing
 from urllib.parse import quote
 
 import bs4
+import soupsieve
 from overrides import override
 
 from byre.clients.api import NexusApi
@@ -30,6 +32,20 @@ from byre.utils import cast, convert_iec_size, int_or, not_none
 _logger = logging.getLogger("byre.clients.byr")
 _warning = _logger.warning
 
+# 每个页面都要用到的选择器，预先编译好。
+_TORRENT_ROWS = soupsieve.compile("table.torrents > tr")
+_INFO_BLOCK_ACTIVE = soupsieve.compile("#info_block span.color_active")
+_EMBEDDED_CELLS = soupsieve.compile(".embedded table tr td")
+_PUBLISHED_AT = re.compile("发布于\\s*(\\d{4}-\\d{2}-\\d{2} \\d{2}:\\d{2}(?::\\d{2})?)")
+
+
+def _find_tag(selector: soupsieve.SoupSieve, page: bs4.Tag, text: str) -> bs4.Tag:
+    """找到第一个包含 `text` 的元素，找到就停，不用把所有匹配的元素都过一遍。"""
+    return not_none(
+        next((tag for tag in selector.iselect(page) if text in tag.text), None),
+        f"页面中找不到“{text}”",
+    )
+
 
 class TjuPtClient(NexusClient):
     """北洋园登录及会话管理。"""
@@ -37,8 +53,9 @@ class TjuPtClient(NexusClient):
     @classmethod
     @override
     def get_url(cls, path: str) -> str:
-        return f"https://tjupt.org/{path}"
+        return "https://tjupt.org/" + path
 
+    @override
     def _authorize_session(self):
         self._session.cookies.clear()
 
@@ -91,7 +108,7 @@ class TjuPtApi(NexusApi):
             + ("" if search is None else f"&search={quote(search)}")
         )
         return self._extract_torrent_table(
-            page_element.select("table.torrents > tr")[1:]
+            _TORRENT_ROWS.select(page_element)[1:]
         )
 
     @classmethod
@@ -110,28 +127,19 @@ class TjuPtApi(NexusApi):
     @classmethod
     @override
     def _extract_info_bar_ranking(cls, page: bs4.Tag) -> int:
-        tag = [
-            tag
-            for tag in page.select("#info_block span.color_active")
-            if "上传排名" in tag.text
-        ][0]
+        tag = _find_tag(_INFO_BLOCK_ACTIVE, page, "上传排名")
         return int_or(not_none(tag.find_next_sibling(name="a")).text.strip())
 
     @classmethod
     @override
     def _extract_page_subtitle(cls, page: bs4.Tag) -> str:
-        tag = [
-            tag for tag in page.select(".embedded table tr td") if "副标题" in tag.text
-        ][0]
+        tag = _find_tag(_EMBEDDED_CELLS, page, "副标题")
         return not_none(tag.next_sibling).text.strip()
 
     @classmethod
-    def _extract_basic_info_row(cls, page: bs4.Tag) -> dict[str, str]:
-        row = [
-            tag
-            for tag in page.select(".embedded table tr td")
-            if "基本信息" in tag.text
-        ][0]
+    @override
+    def _extract_page_basic_info(cls, page: bs4.Tag) -> dict[str, str]:
+        row = _find_tag(_EMBEDDED_CELLS, page, "基本信息")
         info = {}
         for tag in cast(bs4.Tag, not_none(row.find_next("td"))).find_all(
             "b", recursive=False
@@ -141,28 +149,21 @@ class TjuPtApi(NexusApi):
 
     @classmethod
     @override
-    def _extract_page_categories(cls, page: bs4.Tag) -> tuple[str, str]:
-        info = cls._extract_basic_info_row(page)
+    def _extract_page_categories(
+        cls, page: bs4.Tag, basic_info: dict[str, str]
+    ) -> tuple[str, str]:
         # 二级分类不想提取了，每个一级分类类别都的二级分类标识都在不同地方……
-        return info["类型:"], "北洋园"
+        return basic_info["类型:"], "北洋园"
 
     @classmethod
     @override
-    def _extract_page_size(cls, page: bs4.Tag) -> float:
-        return convert_iec_size(cls._extract_basic_info_row(page)["大小:"])
+    def _extract_page_size(cls, page: bs4.Tag, basic_info: dict[str, str]) -> float:
+        return convert_iec_size(basic_info["大小:"])
 
     @classmethod
     @override
     def _extract_page_upload_time(cls, page: bs4.Tag) -> datetime.datetime:
-        row = [
-            tag
-            for tag in page.select(".embedded table tr td")
-            if "种子名称" in tag.text
-        ][0]
-        text = not_none(
-            not_none(row.find_next("td")).find(
-                string=lambda s: ("发布于" in s) # type: ignore
-            )
-        ).text
-        i = text.index("发布于")
-        return datetime.datetime.fromisoformat(text[i + 3 :].strip())
+        row = _find_tag(_EMBEDDED_CELLS, page, "种子名称")
+        text = cast(bs4.Tag, not_none(row.find_next("td"))).get_text(" ")
+        match = not_none(_PUBLISHED_AT.search(text), "找不到发布时间")
+        return datetime.datetime.fromisoformat(match.group(1))
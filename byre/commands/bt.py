@@ -13,26 +13,33 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import heapq
 import logging
+import operator
 import typing
 
 import click
 from overrides import override
 
 import byre.clients
-from byre.bt import BtClient
 from byre.commands import pretty
 from byre.commands.config import GlobalConfig, ConfigurableGroup
 from byre.commands.nexus import NexusCommand
 
+if typing.TYPE_CHECKING:
+    from byre.bt import BtClient
+
 
 _warning = logging.getLogger("byre.commands.bt").warning
 
+#: 按预先算好的排序键（二元组第一项）排序。
+_SORT_KEY = operator.itemgetter(0)
+
 
 class BtCommand(ConfigurableGroup):
     def __init__(self, *remotes: NexusCommand):
         self._config: typing.Optional[GlobalConfig] = None
-        self._api: typing.Optional[BtClient] = None
+        self._api: typing.Optional["BtClient"] = None
         super().__init__(
             name="qbt",
             help="访问 qBittorrent 信息。",
@@ -47,13 +54,18 @@ class BtCommand(ConfigurableGroup):
         return self._config
 
     @property
-    def api(self) -> BtClient:
+    def api(self) -> "BtClient":
         if self._api is None:
             raise RuntimeError("API 未初始化")
         return self._api
 
     @override
     def configure(self, config: GlobalConfig):
+        if self._api is not None:
+            # 一次运行中会被多处重复配置，沿用已有的连接，不必重新登录 qBittorrent。
+            return
+        from byre.bt import BtClient
+
         self._api = BtClient(config.require(str, "qbittorrent", "url", password=True))
         self._api.load_config(config)
         self._config = config
@@ -74,7 +86,14 @@ class BtCommand(ConfigurableGroup):
         type=click.Choice(list(byre.clients.SITES.keys()) + [""]),
         help="只显示某个 PT 站点的种子",
     )
-    def list(self, wants_all: bool, speed: bool, pt: str):
+    @click.option(
+        "-n",
+        "--limit",
+        default=0,
+        type=click.IntRange(min=0),
+        help="只显示最靠前的若干个种子（默认显示全部）",
+    )
+    def list(self, wants_all: bool, speed: bool, pt: str, limit: int):
         """列出本地所有相关种子。"""
         if pt:
             site = self.sites[pt]
@@ -90,15 +109,21 @@ class BtCommand(ConfigurableGroup):
         torrents = self.api.list_torrents(
             remote, wants_all=wants_all, site=pt if pt else None
         )
+        # 先把排序键算好，排序时就不用每次都调用 lambda 了。
         if speed:
-            torrents = [
-                t for t in torrents if t.torrent.dlspeed + t.torrent.upspeed > 0
+            keyed = [
+                (s, t)
+                for t in torrents
+                if (s := t.torrent.dlspeed + t.torrent.upspeed) > 0
             ]
-            torrents.sort(
-                key=lambda t: t.torrent.dlspeed + t.torrent.upspeed, reverse=True
-            )
         else:
-            torrents.sort(key=lambda t: t.torrent.last_activity, reverse=True)
+            keyed = [(t.torrent.last_activity, t) for t in torrents]
+        if 0 < limit < len(keyed):
+            # 只要前几个的话用堆就行，不必整个排序。
+            keyed = heapq.nlargest(limit, keyed, key=_SORT_KEY)
+        else:
+            keyed.sort(key=_SORT_KEY, reverse=True)
+        torrents = [t for _, t in keyed]
         if len(torrents) == 0:
             _warning("本地无相关种子")
             return
@@ -13,21 +13,40 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import copy
+import functools
 import logging
 import os
 import pathlib
+import re
 import typing
 from abc import ABCMeta, abstractmethod
 
 import click
-import tomli
 
-from byre import setup
+try:
+    # Python 3.11 起标准库自带 TOML 解析。
+    import tomllib
+except ImportError:
+    import tomli as tomllib
 
 _logger = logging.getLogger("byre.commands.config")
 _debug, _info, _warning = _logger.debug, _logger.info, _logger.warning
 
 
+#: 配置项缺失时 `GlobalConfig._get` 的返回值。
+_MISSING = object()
+
+
+def _flatten(node: dict[str, typing.Any], prefix: tuple[str, ...] = ()):
+    """把嵌套的配置表展开成“路径 -> 值”，中间的表本身也会保留。"""
+    for key, value in node.items():
+        path = (*prefix, key)
+        yield path, value
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+
+
 class GlobalConfig(click.ParamType):
     """配置文件。"""
 
@@ -35,6 +54,8 @@ class GlobalConfig(click.ParamType):
 
     def __init__(self):
         self._config: typing.Optional[dict[str, typing.Any]] = None
+        #: 以路径为键的配置项，省得每次查找都逐层遍历。
+        self._flat: dict[tuple[str, ...], typing.Any] = {}
 
     @property
     def config(self):
@@ -46,60 +67,79 @@ class GlobalConfig(click.ParamType):
         return self.load(value)
 
     def load(self, path: str):
-        if not path:
-            default_path = setup.default_config_path()
-            for f in [
-                "byre.toml",
-                str(default_path),
-                "/etc/byre.toml",
-                "/etc/byre/byre.toml",
-            ]:
-                if os.path.exists(f):
-                    _info("默认选定配置文件：%s", pathlib.Path(f))
-                    path = f
-                    break
-            else:
-                _warning(
-                    "找不到配置文件“byre.toml”，如果已有配置文件，请尝试使用 -c / --config 选项"
-                )
-                if (
-                    click.prompt(
-                        "是否创建配置文件？",
-                        type=click.Choice(["yes", "no"]),
-                        default="no",
-                        prompt_suffix=" ",
-                    )
-                    == "yes"
-                ):
-                    path = str(setup.setup().resolve())
-                else:
-                    raise FileNotFoundError("找不到配置文件")
-        with open(path, "rb") as file:
-            self._config = tomli.load(file)
+        with open(path, "rb") if path else self._open_default() as file:
+            self._config = tomllib.load(file)
+        self._flat = dict(_flatten(self._config))
         return self
 
+    @staticmethod
+    def _open_default() -> typing.BinaryIO:
+        """按顺序找默认的配置文件，直接尝试打开，不必先检查一遍是否存在。"""
+        # byre.setup 会反过来导入本模块，而且只在找配置文件时用得上，所以在这里才导入。
+        from byre import setup
+
+        default_path = setup.default_config_path()
+        for f in [
+            "byre.toml",
+            str(default_path),
+            "/etc/byre.toml",
+            "/etc/byre/byre.toml",
+        ]:
+            try:
+                file = open(f, "rb")
+            except FileNotFoundError:
+                continue
+            _info("默认选定配置文件：%s", pathlib.Path(f))
+            return file
+        _warning(
+            "找不到配置文件“byre.toml”，如果已有配置文件，请尝试使用 -c / --config 选项"
+        )
+        if (
+            click.prompt(
+                "是否创建配置文件？",
+                type=click.Choice(["yes", "no"]),
+                default="no",
+                prompt_suffix=" ",
+            )
+            == "yes"
+        ):
+            return open(setup.setup().resolve(), "rb")
+        raise FileNotFoundError("找不到配置文件")
+
     def require(self, typer: typing.Callable, *args, password=False):
-        config = typing.cast(typing.Any, self.config)
-        for arg in args:
-            if arg not in config:
-                if password:
-                    config = click.prompt(
-                        f"请输入 {'.'.join(args)} 配置：", hide_input=True
-                    )
-                    break
+        config = self._get(*args)
+        if config is _MISSING:
+            if not password:
                 raise ValueError(f"缺失 {'.'.join(args)} 配置参数")
-            config = config[arg]
+            # 先看环境变量（例如 BYRE_BYR_PASSWORD），方便非交互使用。
+            env = "BYRE_" + re.sub("\\W", "_", "_".join(args)).upper()
+            config = os.environ.get(env)
+            if config is None:
+                config = click.prompt(
+                    f"请输入 {'.'.join(args)} 配置：", hide_input=True
+                )
+            # 各个命令可能会重复 configure，记下来避免重复询问。
+            self._flat[args] = config
         try:
             return typer(config)
         except ValueError as e:
             raise ValueError(f"配置项 {'.'.join(args)} 的值 {config} 无效：{e}")
 
     def optional(self, typer: typing.Callable, default: typing.Any, *args):
+        value = self._get(*args)
+        if value is _MISSING:
+            return default
         try:
-            return self.require(typer, *args)
+            return typer(value)
         except ValueError:
             return default
 
+    def _get(self, *args):
+        """查找配置项，找不到时返回 ``_MISSING`` 而不是抛异常。"""
+        if self._config is None:
+            raise RuntimeError("未初始化")
+        return self._flat.get(args, _MISSING)
+
 
 class ConfigurableGroup(click.Group, metaclass=ABCMeta):
     """能够把 ``GlobalConfig`` 导出传递从而实现 ``click`` 下手动的依赖注入的基类。"""
@@ -115,44 +155,37 @@ class ConfigurableGroup(click.Group, metaclass=ABCMeta):
     def add_command(
         self, cmd: click.Command, name: typing.Optional[str] = None
     ) -> None:
-        inner = cmd.callback
-
+        assert cmd.callback
+        # 继承下的同一个函数对应的 Command 是同一个，所以必须复制；
+        # 浅复制就够了，只需要换掉 callback。
+        command = copy.copy(cmd)
         # click 下看起来只能通过这种方法把 self 传进去……
-        def callback(*args, **kwargs):
-            assert inner
-            inner(self, *args, **kwargs)
-
-        # 继承下的同一个函数对应的 Command 是同一个，所以必须复制。
-        super().add_command(
-            click.Command(
-                name=cmd.name,
-                context_settings=cmd.context_settings,
-                callback=callback,
-                params=cmd.params,
-                help=cmd.help,
-                epilog=cmd.epilog,
-                short_help=cmd.short_help,
-                options_metavar=cmd.options_metavar,
-                add_help_option=cmd.add_help_option,
-                no_args_is_help=cmd.no_args_is_help,
-                hidden=cmd.hidden,
-                deprecated=cmd.deprecated,
-            ),
-            name,
-        )
+        command.callback = functools.partial(cmd.callback, self)
+        super().add_command(command, name)
 
     def register(self, group: click.Group):
         group.add_command(self)
-        for attr in (name for name in dir(self) if not name.startswith("_")):
-            try:
-                method = getattr(self, attr)
-                if (
-                    callable(method)
-                    and isinstance(method, click.Command)
-                    and not isinstance(method, ConfigurableGroup)
-                ):
-                    self.add_command(method)
-            except RuntimeError as e:
-                if "未初始化" not in e.args[0]:
-                    raise e
+        for command in self._class_commands():
+            self.add_command(command)
         return self
+
+    @classmethod
+    def _class_commands(cls) -> typing.Iterable[click.Command]:
+        """
+        找出类定义里的子命令（子类里的同名属性会覆盖父类的）。
+
+        直接看各个类的 ``__dict__`` ，不用 ``dir(self)`` 再逐个 ``getattr`` ，
+        也就不会触发 ``api`` 之类未初始化时会报错的属性。
+        """
+        commands: dict[str, click.Command] = {}
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                if name.startswith("_"):
+                    continue
+                if isinstance(attr, click.Command) and not isinstance(
+                    attr, ConfigurableGroup
+                ):
+                    commands[name] = attr
+                else:
+                    commands.pop(name, None)
+        return commands.values()
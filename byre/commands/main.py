@@ -14,13 +14,17 @@
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import bisect
+import functools
+import itertools
 import logging
 import math
+import operator
 import os
 import re
+import time
 import typing
+from concurrent.futures import ThreadPoolExecutor
 
-import bencoder
 import click
 from overrides import override
 
@@ -43,6 +47,15 @@ from byre.utils import S, cast
 _logger = logging.getLogger("byre.commands.main")
 _debug, _info, _warning = _logger.debug, _logger.info, _logger.warning
 
+#: 种子名称里用于分词的字符（数字、空格、ASCII 标点）。
+_WORD_SEP = re.compile("[\\d -@\\[-`{-~]")
+
+
+@functools.lru_cache(maxsize=4096)
+def _keywords(name: str) -> frozenset[str]:
+    """提取名称中长度大于 3 的关键词，同一名称会与很多种子比较，所以缓存起来。"""
+    return frozenset(s for s in _WORD_SEP.split(name.lower()) if len(s) > 3)
+
 
 class MainCommand(ConfigurableGroup):
     def __init__(self, bt: BtCommand, byr: ByrCommand, *sites: NexusCommand):
@@ -163,13 +176,18 @@ class MainCommand(ConfigurableGroup):
         if len(pending) == 0:
             _info("所有种子均已经正确命名")
             return
+        # 不同列表里常有同一个种子，详情只抓一次。
+        infos: dict[int, TorrentInfo] = {}
+        # 按顺序一个一个列表地抓，全都匹配上了就不用再抓剩下的列表了。
         for kind in [
             UserTorrentKind.SEEDING,
             UserTorrentKind.COMPLETED,
             UserTorrentKind.LEECHING,
             UserTorrentKind.INCOMPLETE,
         ]:
-            self._match_against_remote(pending, self.byr.api.list_user_torrents(kind))
+            self._match_against_remote(
+                pending, self.byr.api.list_user_torrents(kind), infos
+            )
             if all(t.seed_id != 0 for t in pending):
                 break
         rename_actions = pretty.pretty_rename(pending)
@@ -189,12 +207,17 @@ class MainCommand(ConfigurableGroup):
     def stat(self):
         """显示当前本地统计信息。"""
         local = self.bt.api.list_torrents([])
-        finished = sum(t.torrent.amount_left == 0 for t in local)
-        amount_left = sum(t.torrent.amount_left for t in local)
-        dl_speed = sum(t.torrent.dlspeed for t in local)
-        up_speed = sum(t.torrent.upspeed for t in local)
-        uploaded = sum(t.torrent.uploaded for t in local)
-        uploaded_session = sum(t.torrent.uploaded_session for t in local)
+        # 一次遍历把各项统计都累加起来。
+        finished = amount_left = dl_speed = up_speed = uploaded = uploaded_session = 0
+        for t in local:
+            torrent = t.torrent
+            left = torrent.amount_left
+            finished += left == 0
+            amount_left += left
+            dl_speed += torrent.dlspeed
+            up_speed += torrent.upspeed
+            uploaded += torrent.uploaded
+            uploaded_session += torrent.uploaded_session
         click.echo(
             f"当前管理种子数：{len(local)}，"
             f"下载完成数 {finished}，"
@@ -296,60 +319,80 @@ class MainCommand(ConfigurableGroup):
             t for t in torrents if t.site == "byr" and t.torrent.amount_left == 0
         ]
         byr_torrents.sort(key=lambda t: t.torrent.size)
-        existing_seeds: dict[str, list[int]] = dict(
-            (name, []) for name in self.sites.keys()
-        )
+        existing_seeds: dict[str, set[int]] = {name: set() for name in self.sites}
         for t in torrents:
             if t.site != "byr":
-                existing_seeds[t.site].append(t.seed_id)
-
-        # 用 bisect 按照 torrent.torrent.size 来查找种子。
-        class SizeSearchable(typing.Sequence):
-            def __init__(self, ts: list[LocalTorrent]):
-                self.torrents = ts
+                existing_seeds[t.site].add(t.seed_id)
 
-            def __getitem__(self, item):
-                return self.torrents[item].torrent.size
-
-            def __len__(self):
-                return len(self.torrents)
-
-        local_byr = SizeSearchable(byr_torrents)
-        matches = []
-        for name, existing in existing_seeds.items():
-            api = self.sites[name].api
-            page = []
-            page.extend(api.list_torrents(page=0))
-            page.extend(
-                api.list_torrents(page=0, sorted_by=NexusSortableField.LEECHER_COUNT)
-            )
-            page.extend(
-                api.list_torrents(page=0, sorted_by=NexusSortableField.SEEDER_COUNT)
+        # 各站点、各种排序的列表互不相关，一起并发抓取（请求频率仍然由各站点的客户端限制）。
+        orders = [
+            NexusSortableField.ID,
+            NexusSortableField.LEECHER_COUNT,
+            NexusSortableField.SEEDER_COUNT,
+        ]
+        jobs = list(itertools.product(existing_seeds, orders))
+        with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as executor:
+            lists = executor.map(
+                lambda job: self.sites[job[0]].api.list_torrents(
+                    page=0, sorted_by=job[1]
+                ),
+                jobs,
             )
+            pages: dict[str, list[TorrentInfo]] = {name: [] for name in existing_seeds}
+            for (site, _), page in zip(jobs, lists):
+                pages[site].extend(page)
+
+        # 用 bisect 按照 torrent.torrent.size 来查找种子。
+        local_sizes = [t.torrent.size for t in byr_torrents]
+        # 本地种子的关键词在整个匹配过程中不变，先提取好。
+        local_words = [_keywords(t.torrent.name) for t in byr_torrents]
+        candidates: list[tuple[str, LocalTorrent, TorrentInfo]] = []
+        for site, page in pages.items():
+            existing = existing_seeds[site]
             page.sort(key=lambda t: t.file_size)
-            existing_set = set(existing)
             for torrent in page:
-                if torrent.seed_id in existing_set:
+                if torrent.seed_id in existing:
                     continue
                 # 只匹配总大小误差在 1% 范围内的种子。
-                i = bisect.bisect_left(local_byr, 0.99 * torrent.file_size)
-                for local in byr_torrents[i:]:
-                    if 1.01 * torrent.file_size < local.torrent.size:
+                low, high = 0.99 * torrent.file_size, 1.01 * torrent.file_size
+                i = bisect.bisect_left(local_sizes, low)
+                remote_words = _keywords(torrent.title)
+                # 按下标往后走，大小直接从 local_sizes 里拿，不用切片复制列表。
+                for j in range(i, len(byr_torrents)):
+                    if high < local_sizes[j]:
                         break
                     # 最严格的是一个一个区块的哈希比较，但是可能会有重新做种块大小改变的情况。
                     # 总之这些 PT 站还是比较严格的，文件名大概率有格式可寻，不同种子文件名不同，
                     # 因此比较文件名、文件大小应该可以保证是同一个种子。
-                    if self._match_words(local.torrent.name, torrent.title):
+                    if not remote_words.isdisjoint(local_words[j]):
+                        local = byr_torrents[j]
                         _debug(
                             "关键词提取匹配了 %s 和 %s",
                             local.torrent.name,
                             torrent.title,
                         )
-                        remote_content = api.download_torrent(torrent.seed_id)
-                        if self._torrent_files_exact_match(
-                            local, remote_content, torrent
-                        ):
-                            matches.append((local, torrent, remote_content))
+                        candidates.append((site, local, torrent))
+
+        # 种子文件也并发下载，同一个种子只下载一次。
+        keys = list(dict.fromkeys((site, t.seed_id) for site, _, t in candidates))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            contents = dict(
+                zip(
+                    keys,
+                    executor.map(
+                        lambda key: self.sites[key[0]].api.download_torrent(key[1]),
+                        keys,
+                    ),
+                )
+            )
+        matches = []
+        local_files: dict[str, dict[str, int]] = {}
+        for site, local, torrent in candidates:
+            remote_content = contents[(site, torrent.seed_id)]
+            if self._torrent_files_exact_match(
+                local, remote_content, torrent, local_files
+            ):
+                matches.append((local, torrent, remote_content))
         _info("找到 %d 对匹配", len(matches))
 
         if not dry_run:
@@ -372,14 +415,21 @@ class MainCommand(ConfigurableGroup):
             command = self.sites[site]
             command.configure(self.config)
             api = command.api
-        remote = api.list_user_torrents(
-            kind=UserTorrentKind.SEEDING
-        ) + api.list_user_torrents(kind=UserTorrentKind.LEECHING)
-        scored_local, local_dicts = self._gather_local_info(remote)
+        # 两个列表互不相关，并发抓取；客户端自带的令牌桶会控制请求频率。
+        # 两个请求都要用到用户 ID，先在这里取好，免得两个线程各抓一遍首页。
+        api.current_user_id()
+        kinds = [UserTorrentKind.SEEDING, UserTorrentKind.LEECHING]
+        with ThreadPoolExecutor(max_workers=len(kinds)) as executor:
+            remote = list(
+                itertools.chain.from_iterable(
+                    executor.map(api.list_user_torrents, kinds)
+                )
+            )
+        scored_local, local_indices = self._gather_local_info(remote)
         if targets is None:
             candidates = self._fetch_candidates(
                 scored_local,
-                local_dicts.get(site, {}),
+                local_indices.get(site, {}),
                 remote,
                 free_only=free_only,
                 site=site,
@@ -403,30 +453,35 @@ class MainCommand(ConfigurableGroup):
         estimates, groups = self.planner.estimate(
             scored_local, removable, downloadable, self.store, exists=bool(exists)
         )
-        summary = []
-        for config in self.planner.configs:
-            if config.download_dir not in estimates:
-                continue
-            estimate = estimates[config.download_dir]
-            downloaded, deleted = groups[config.download_dir]
-            summary.append(
-                "\n".join(
-                    (
-                        f"更改总结：{click.style(config.download_dir, bold=True)}",
-                        f"    最大允许空间占用 {S(config.max_total_size)}，"
-                        f"    本次最大下载量为 {S(config.max_download_size)}",
-                        f"    目前总空间占用 {S(estimate.before)}，"
-                        f"    最后预期总占用 {S(estimate.after)}",
-                        f"    将会删除 {len(deleted)} 项内容（共计 {S(estimate.to_be_deleted)}），"
-                        f"    将会下载 {len(downloaded)} 项内容（共计 {S(estimate.to_be_downloaded)}）",
-                        pretty.pretty_changes(deleted, downloaded, duplicates) or "",
+        # 不显示也不输出日志的话就不必构建（挺长的）总结了。
+        if print_scores or _logger.isEnabledFor(logging.INFO):
+            summary = []
+            for config in self.planner.configs:
+                if config.download_dir not in estimates:
+                    continue
+                estimate = estimates[config.download_dir]
+                downloaded, deleted = groups[config.download_dir]
+                summary.append(
+                    "\n".join(
+                        (
+                            f"更改总结：{click.style(config.download_dir, bold=True)}",
+                            f"    最大允许空间占用 {S(config.max_total_size)}，"
+                            f"    本次最大下载量为 {S(config.max_download_size)}",
+                            f"    目前总空间占用 {S(estimate.before)}，"
+                            f"    最后预期总占用 {S(estimate.after)}",
+                            f"    将会删除 {len(deleted)} 项内容（共计 {S(estimate.to_be_deleted)}），"
+                            f"    将会下载 {len(downloaded)} 项内容（共计 {S(estimate.to_be_downloaded)}）",
+                            pretty.pretty_changes(
+                                deleted, downloaded, duplicates, err=not print_scores
+                            )
+                            or "",
+                        )
                     )
                 )
-            )
-        if print_scores:
-            click.echo_via_pager("\n\n".join(summary))
-        else:
-            _info("\n".join(summary))
+            if print_scores:
+                click.echo_via_pager("\n\n".join(summary))
+            else:
+                _info("\n".join(summary))
         if dry_run:
             _info(
                 "以上计划未被实际运行；若想开始下载，请去除命令行 -d / --dry-run 选项"
@@ -435,15 +490,12 @@ class MainCommand(ConfigurableGroup):
             for t, _ in removable:
                 _info("正在删除：%s", t.torrent.name)
                 self.bt.api.remove_torrent(t, duplicates[t.torrent.hash])
-            configured_sites = {}
             for t, directory in downloadable:
                 _info("正在添加下载：[%s-%d]%s", t.site, t.seed_id, t.title)
                 if t.site == "byr":
                     api = self.byr.api
                 else:
-                    if t.site not in configured_sites:
-                        self.sites[t.site].configure(self.config)
-                        configured_sites[t.site] = True
+                    self.sites[t.site].configure(self.config)
                     api = self.sites[t.site].api
                 torrent = api.download_torrent(t.seed_id)
                 if isinstance(exists, LocalTorrent):
@@ -455,33 +507,71 @@ class MainCommand(ConfigurableGroup):
                 )
         return len(downloadable)
 
-    @staticmethod
-    def _merge_torrent_list(*lists: list[TorrentInfo]):
-        result = {}
-        for torrents in lists:
-            for torrent in torrents:
-                if torrent.seed_id not in result:
-                    result[torrent.seed_id] = torrent
-        return list(result.values())
-
     def _match_against_remote(
-        self, pending: list[LocalTorrent], remote: list[TorrentInfo]
+        self,
+        pending: list[LocalTorrent],
+        remote: list[TorrentInfo],
+        infos: dict[int, TorrentInfo],
     ):
-        for local in pending:
-            if local.seed_id != 0:
-                continue
-            for torrent in remote:
-                if not self._match_words(torrent.title, local.torrent.name):
+        # 先用关键词筛出可能匹配的种子，去重之后再并发抓取详情（主要是为了哈希值）。
+        candidates: list[tuple[LocalTorrent, list[TorrentInfo]]] = [
+            (local, []) for local in pending if local.seed_id == 0
+        ]
+        # 关键词到本地种子的倒排索引，这样每个远端种子只需查一遍自己的关键词，
+        # 而不用和每个本地种子逐一比较。
+        index: dict[str, list[int]] = {}
+        for i, (local, _) in enumerate(candidates):
+            for word in _keywords(local.torrent.name):
+                index.setdefault(word, []).append(i)
+        for torrent in remote:
+            for i in {
+                i for word in _keywords(torrent.title) for i in index.get(word, ())
+            }:
+                local, matched = candidates[i]
+                if not self._may_be_same(local, torrent):
                     continue
-                info = self.byr.api.torrent(torrent.seed_id)
-                torrent_hash = info.hash
-                if local.torrent.hash == torrent_hash:
-                    local.seed_id = torrent.seed_id
-                    local.info = info
-                    break
+                _debug("尝试匹配 %s 与 %s", torrent.title, local.torrent.name)
+                matched.append(torrent)
+        for _, matched in candidates:
+            for t in matched:
+                if t.hash != "":
+                    # 列表里已经带了哈希值（抓过详情）的话就不用再抓一次。
+                    infos.setdefault(t.seed_id, t)
+        seed_ids = list(
+            dict.fromkeys(t.seed_id for _, matched in candidates for t in matched)
+        )
+        missing = [seed_id for seed_id in seed_ids if seed_id not in infos]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            infos.update(zip(missing, executor.map(self.byr.api.torrent, missing)))
+        # 哈希值一致就是同一个种子，直接按哈希值查找对应的本地种子。
+        by_hash = {local.torrent.hash: local for local, _ in candidates}
+        for seed_id in seed_ids:
+            info = infos[seed_id]
+            local = by_hash.get(info.hash)
+            if local is not None and local.seed_id == 0:
+                local.seed_id = seed_id
+                local.info = info
+
+    @staticmethod
+    def _may_be_same(local: LocalTorrent, torrent: TorrentInfo):
+        """先用列表里已有的哈希值、大小排除明显不是同一个的种子，省得去抓详情。"""
+        if torrent.hash != "":
+            return torrent.hash == local.torrent.hash
+        if torrent.file_size == 0:
+            return True
+        # 列表里的大小是约数，和 hitchhike 一样允许 1% 的误差。
+        # 本地只选了部分文件下载时 ``size`` 会偏小，所以和种子的总大小 ``total_size`` 比较。
+        return (
+            0.99 * torrent.file_size
+            <= local.torrent.total_size
+            <= 1.01 * torrent.file_size
+        )
 
     @staticmethod
     def _extract_torrent_files(content: bytes):
+        # 只有合并种子时才用得上，用到时再导入。
+        import bencoder
+
         torrent = bencoder.bdecode(content)
         info = torrent[b"info"]
         root = info[b"name"].decode()
@@ -500,16 +590,6 @@ class MainCommand(ConfigurableGroup):
             for file in info[b"files"]
         ]
 
-    @staticmethod
-    def _match_words(a: str, b: str):
-        separator = re.compile("[\\d -@\\[-`{-~]")
-        matches = set(s.lower() for s in separator.split(a) if len(s) > 3) & set(
-            s.lower() for s in separator.split(b) if len(s) > 3
-        )
-        if len(matches) != 0:
-            _debug("尝试匹配 %s 与 %s：%s", a, b, matches)
-        return len(matches) != 0
-
     def _gather_local_info(self, remote: list[TorrentInfo]):
         """
         :param remote: 用户正在下载/做种的种子。
@@ -519,24 +599,24 @@ class MainCommand(ConfigurableGroup):
         _info("正在合并远端种子列表和本地种子列表信息")
         local = self.bt.api.list_torrents(remote)
         _info("正在对本地种子评分")
-        scored_local = [(t, self.scorer.score_uploading(t)) for t in local]
-        # 把评分为 -1 的种子排到后面去。
-        scored_local.sort(key=lambda t: t[1] if t[1] >= 0 else (1 << 31))
+        now = time.time()
+        scored = [(t, self.scorer.score_uploading(t, now)) for t in local]
+        # 把评分为 -1 的种子（保持原有顺序）排到后面去，其余的按评分升序。
+        scored_local = sorted(
+            (t for t in scored if t[1] >= 0), key=operator.itemgetter(1)
+        ) + [t for t in scored if t[1] < 0]
 
-        # local_dicts 是从种子 ID 到 scored_local 的映射。
-        local_dicts = {}
-        for i, t in enumerate(scored_local):
-            site = t[0].site
-            if t[0].site not in local_dicts:
-                local_dicts[site] = {}
-            local_dicts[site][t[0].seed_id] = i
+        # local_indices 是每个站点从种子 ID 到 scored_local 序号的映射。
+        local_indices: dict[str, dict[int, int]] = {}
+        for i, (t, _) in enumerate(scored_local):
+            local_indices.setdefault(t.site, {})[t.seed_id] = i
 
-        return scored_local, local_dicts
+        return scored_local, local_indices
 
     def _fetch_candidates(
         self,
         scored_local: list[tuple[LocalTorrent, float]],
-        local_dict: dict[int, int],
+        local_index: dict[int, int],
         remote: list[TorrentInfo],
         free_only: bool,
         site: str,
@@ -546,28 +626,34 @@ class MainCommand(ConfigurableGroup):
             api = self.byr.api
         else:
             api = self.sites[site].api
-        lists = [
-            api.list_torrents(page=0),
-            api.list_torrents(page=0, sorted_by=NexusSortableField.LEECHER_COUNT),
-            api.list_torrents(page=0, promotion=TorrentPromotion.FREE),
-        ]
+        # 三个列表互不相关，并发抓取（请求频率仍然由客户端限制）。
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            lists = list(
+                executor.map(
+                    lambda kwargs: api.list_torrents(page=0, **kwargs),
+                    [
+                        {},
+                        {"sorted_by": NexusSortableField.LEECHER_COUNT},
+                        {"promotion": TorrentPromotion.FREE},
+                    ],
+                )
+            )
         # 我们只支持批量抓取北邮人的种子，这里的 downloading_ids 是为了防止多客户端
         # （例如 NAS 一个，笔记本一个）被禁止下载的情况。
         downloading_ids = set(t.seed_id for t in remote)
-        # 用于去重。
-        added: set[int] = set()
+        # 三个列表之间会有重复，去重和筛选一起做，每个种子只保留最先出现的那个。
+        seen: set[int] = set()
         fetched = []
         _debug("正在将已下载的种子从新种子列表中除去")
-        for torrent in self._merge_torrent_list(*lists):
-            if torrent.seed_id in local_dict:
-                i = local_dict[torrent.seed_id]
-                if i != -1:
-                    scored_local[i][0].info = torrent
-            elif torrent.seed_id in downloading_ids:
+        for torrent in itertools.chain.from_iterable(lists):
+            if torrent.seed_id in seen:
                 continue
-            elif torrent.seed_id not in added:
+            seen.add(torrent.seed_id)
+            i = local_index.get(torrent.seed_id)
+            if i is not None:
+                scored_local[i][0].info = torrent
+            elif torrent.seed_id not in downloading_ids:
                 fetched.append(torrent)
-                added.add(torrent.seed_id)
 
         if free_only:
             _debug("正在筛选免费促销的种子")
@@ -580,12 +666,27 @@ class MainCommand(ConfigurableGroup):
 
     @classmethod
     def _torrent_files_exact_match(
-        cls, local: LocalTorrent, remote_torrent: bytes, remote: TorrentInfo
+        cls,
+        local: LocalTorrent,
+        remote_torrent: bytes,
+        remote: TorrentInfo,
+        local_cache: typing.Optional[dict[str, dict[str, int]]] = None,
     ):
-        local_files = dict(
-            (cast(str, file.name), cast(int, file.size)) for file in local.torrent.files
-        )
+        """
+        :param local_cache: 本地种子哈希值到文件列表的缓存。每次读 ``files`` 都是一次
+        qBittorrent 请求，同一个本地种子与多个远端种子比较时可以共用。
+        """
         remote_files = dict(cls._extract_torrent_files(remote_torrent))
+        local_files = (
+            None if local_cache is None else local_cache.get(local.torrent.hash)
+        )
+        if local_files is None:
+            local_files = dict(
+                (cast(str, file.name), cast(int, file.size))
+                for file in local.torrent.files
+            )
+            if local_cache is not None:
+                local_cache[local.torrent.hash] = local_files
         if local_files == remote_files:
             _debug(
                 "文件详情匹配：均 %d 文件，文件路径、文件大小完全一致", len(local_files)
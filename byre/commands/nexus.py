@@ -54,6 +54,9 @@ class NexusCommand(ConfigurableGroup):
 
     @override
     def configure(self, config: GlobalConfig):
+        if self._api is not None:
+            # 一次运行中会被多处重复配置，沿用已经建立的会话，不必重新读取 Cookies。
+            return
         site = self.api_cls.site()
         proxy = config.optional(str, "", site, "http_proxy")
         self._api = self.api_cls(
@@ -13,10 +13,13 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
+import sys
 import time
+import typing
 
 import click
-import tabulate
+import wcwidth
 
 from byre.clients import CLIENTS
 from byre.clients.api import NexusApi
@@ -24,6 +27,188 @@ from byre.clients.data import TorrentInfo, NexusUser, LocalTorrent
 from byre.utils import S
 
 
+def _tabulate(*args, **kwargs) -> str:
+    """用到的时候再导入 tabulate，只看个 ``--help`` 就不必加载它了。"""
+    import tabulate
+
+    return tabulate.tabulate(*args, **kwargs)
+
+
+def _styler(enabled: bool, **styles) -> typing.Callable[[str], str]:
+    """
+    预先生成 `click.style` 的转义序列模板。
+
+    列表里每行都要调用好多次 `click.style` ，每次都要重新拼一遍转义序列，这里只拼一次。
+    """
+    if not enabled:
+        return str
+    return click.style("{}", **styles).format
+
+
+class _Styles:
+    """列表、总结表格里用到的所有样式以及固定的标记。"""
+
+    def __init__(self, enabled: bool):
+        self.bold = _styler(enabled, bold=True)
+        self.dim = _styler(enabled, dim=True)
+        self.yellow = _styler(enabled, fg="yellow")
+        self.bright_yellow = _styler(enabled, fg="bright_yellow")
+        self.bright_green = _styler(enabled, fg="bright_green")
+        self.bright_red = _styler(enabled, fg="bright_red")
+        self.cyan = _styler(enabled, fg="cyan")
+        self.bright_cyan = _styler(enabled, fg="bright_cyan")
+        self.bright_magenta = _styler(enabled, fg="bright_magenta")
+
+        # 重命名、更改总结表格里固定的标记。
+        self.arrow = self.dim("=>")
+        self.mark_failed = self.bright_red("!!")
+        self.mark_no_match = self.yellow("未能找到匹配")
+        self.mark_found = self.bright_green("✓")
+        self.mark_delete = self.bright_red("删")
+        self.mark_duplicate = self.bright_yellow("同")
+        self.mark_new = self.bright_cyan("新")
+
+
+_STYLED = _Styles(True)
+_PLAIN = _Styles(False)
+
+
+def _styles(err: bool = False) -> _Styles:
+    """
+    根据输出流选择样式。
+
+    输出不是终端（重定向到文件、管道）时 click 输出时反正会把转义序列去掉，那就干脆不加样式。
+    每次输出前再判断，免得导入之后输出流被替换（例如测试里）就判断错了。
+    """
+    stream = sys.stderr if err else sys.stdout
+    return _STYLED if stream.isatty() else _PLAIN
+
+
+_ANSI_ESCAPE = re.compile("(\x1b\\[[0-9;]*m)")
+_ANSI_RESET = "\x1b[0m"
+
+
+def _wrap_cell(text: str, limit: int) -> list[str]:
+    """
+    按显示宽度折行，折行处先重置样式，下一行再把样式接上。
+
+    tabulate 算宽度时会被 ANSI 转义序列搞乱，所以自己折行。和 tabulate（也就是 `textwrap` ）一样
+    优先在空格处断行，断行处的空格会被去掉；比一整行还长的单词才按字符硬折行。
+    唯一的区别是不在连字符处断行（ ``WEB-DL`` 之类的不拆开）。
+    """
+    # 每个可见字符：(紧挨在它前面的转义序列, 字符, 显示宽度, 该字符生效的样式)
+    units: list[tuple[str, str, int, list[str]]] = []
+    escapes, active = "", []
+    for part in _ANSI_ESCAPE.split(text):
+        if _ANSI_ESCAPE.fullmatch(part):
+            active = [] if part == _ANSI_RESET else active + [part]
+            escapes += part
+            continue
+        for char in part:
+            w = 0 if char == "\n" else max(wcwidth.wcwidth(char), 0)
+            units.append((escapes, char, w, active))
+            escapes = ""
+
+    lines: list[list[tuple[str, str, int, list[str]]]] = []
+    # `fresh` 表示当前行是段落的第一行：段落开头的空格保留，折行后行首的空格去掉。
+    line, width, fresh = [], 0, True
+    i = 0
+    while i < len(units):
+        char = units[i][1]
+        if char == "\n":
+            lines.append(line)
+            line, width, fresh = [], 0, True
+            i += 1
+            continue
+        # 取出下一个单词或者一串空格。
+        j = i
+        while (
+            j < len(units)
+            and units[j][1] != "\n"
+            and units[j][1].isspace() == char.isspace()
+        ):
+            j += 1
+        chunk = units[i:j]
+        i = j
+        chunk_width = sum(unit[2] for unit in chunk)
+        if char.isspace():
+            if (width > 0 or fresh) and width + chunk_width <= limit:
+                line += chunk
+                width += chunk_width
+            elif width > 0:
+                lines.append(line)
+                line, width, fresh = [], 0, False
+            continue
+        if width + chunk_width <= limit:
+            line += chunk
+            width += chunk_width
+            continue
+        if chunk_width <= limit:
+            if not all(u[1].isspace() for u in line):
+                lines.append(line)
+            line, width, fresh = list(chunk), chunk_width, False
+            continue
+        # 单词比一整行还长，先填满当前行剩下的位置。
+        for unit in chunk:
+            if width + unit[2] > limit and width > 0:
+                if not all(u[1].isspace() for u in line):
+                    lines.append(line)
+                line, width, fresh = [], 0, False
+            line.append(unit)
+            width += unit[2]
+    if line or fresh:
+        lines.append(line)
+
+    rendered = []
+    for line in lines:
+        while line and line[-1][1].isspace():
+            line = line[:-1]
+        if len(line) == 0:
+            rendered.append("")
+            continue
+        content = "".join(line[0][3]) + line[0][1]
+        content += "".join(prefix + char for prefix, char, _, _ in line[1:])
+        rendered.append(content + _ANSI_RESET if line[-1][3] else content)
+    if escapes:
+        # 末尾的转义序列（一般是重置样式）留在最后一行。
+        last = rendered[-1]
+        if last.endswith(_ANSI_RESET) and lines[-1]:
+            last = last[: -len(_ANSI_RESET)]
+        rendered[-1] = last + escapes
+    return rendered
+
+
+def _display_width(text: str) -> int:
+    return max(wcwidth.wcswidth(_ANSI_ESCAPE.sub("", text)), 0)
+
+
+def _render_table(
+    rows: list[tuple[typing.Any, ...]], headers: list[str], limits: list[int]
+) -> str:
+    """种子列表用的简单表格，格式和 tabulate 的 ``simple`` 格式一样，每列左对齐。"""
+    wrapped = [
+        [_wrap_cell(str(cell), limit) for cell, limit in zip(row, limits)]
+        for row in rows
+    ]
+    widths = [_display_width(header) for header in headers]
+    for row in wrapped:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], *(_display_width(line) for line in cell))
+
+    def line_of(cells: typing.Iterable[str]) -> str:
+        return "  ".join(
+            cell + " " * (width - _display_width(cell))
+            for cell, width in zip(cells, widths)
+        ).rstrip()
+
+    output = [line_of(headers), line_of("-" * width for width in widths)]
+    for row in wrapped:
+        height = max(len(cell) for cell in row)
+        for i in range(height):
+            output.append(line_of(cell[i] if i < len(cell) else "" for cell in row))
+    return "\n".join(output)
+
+
 def parse_url_id(s: str):
     """把用户输入里抑或是链接抑或是 ID 的字符串转为 ID。"""
     if s.isdigit():
@@ -34,7 +219,7 @@ def parse_url_id(s: str):
 
 def pretty_torrent_info(torrent: TorrentInfo):
     click.echo(
-        tabulate.tabulate(
+        _tabulate(
             [
                 ("标题", click.style(torrent.title, bold=True)),
                 ("副标题", click.style(torrent.sub_title, dim=True)),
@@ -83,7 +268,7 @@ def pretty_torrent_info(torrent: TorrentInfo):
 
 def pretty_user_info(user: NexusUser):
     click.echo(
-        tabulate.tabulate(
+        _tabulate(
             [
                 ("用户名", click.style(user.username, bold=True)),
                 (
@@ -119,6 +304,7 @@ def pretty_torrent_list(torrents: list[TorrentInfo]):
     if len(torrents) == 0:
         click.echo("种子列表为空")
         return
+    style = _styles()
     table = []
     header = ["ID", "标题", ""]
     limits = [8, 54, 10]
@@ -126,105 +312,98 @@ def pretty_torrent_list(torrents: list[TorrentInfo]):
         promotion = (
             ""
             if len(list(t.promotions.get_promotions())) == 0
-            else click.style(f"[{str(t.promotions)}] ", fg="bright_yellow")
+            else style.bright_yellow(f"[{str(t.promotions)}] ")
         )
         table.append(
             (
                 t.seed_id,
-                click.style(t.title, bold=True),
-                click.style(f"{S(t.file_size)}", fg="bright_yellow"),
+                style.bold(t.title),
+                style.bright_yellow(f"{S(t.file_size)}"),
             )
         )
         table.append(
             (
                 "",
                 promotion
-                + click.style(t.sub_title, dim=True)
+                + style.dim(t.sub_title)
                 + " ("
-                + click.style(f"{t.seeders}↑", fg="bright_green")
+                + style.bright_green(f"{t.seeders}↑")
                 + " "
-                + click.style(f"{t.leechers}↓", fg="cyan")
+                + style.cyan(f"{t.leechers}↓")
                 + " )",
-                click.style(f"{t.live_time:.2f} 天", fg="bright_magenta"),
+                style.bright_magenta(f"{t.live_time:.2f} 天"),
             )
         )
-    click.echo_via_pager(
-        tabulate.tabulate(
-            table, headers=header, maxcolwidths=limits, disable_numparse=True
-        )
-    )
+    click.echo_via_pager(_render_table(table, header, limits))
 
 
 def pretty_local_torrents(torrents: list[LocalTorrent], speed=False):
     if len(torrents) == 0:
         click.echo("种子列表为空")
         return
+    style = _styles()
     table = []
     header = ["最后活跃", "标题", "速度" if speed else "累计", "分享率"]
     limits = [8, 44, 10, 10]
+    now = time.time()
     for t in torrents:
-        days = (time.time() - t.torrent.last_activity) / (24 * 60 * 60)
+        days = (now - t.torrent.last_activity) / (24 * 60 * 60)
         table.append(
             (
-                click.style(f"{days:.2f} 天", fg="yellow"),
-                click.style(t.torrent.name, bold=True),
-                click.style(
+                style.yellow(f"{days:.2f} 天"),
+                style.bold(t.torrent.name),
+                style.bright_green(
                     (
                         f"{S(t.torrent.upspeed)}/s↑"
                         if speed
                         else f"{S(t.torrent.uploaded)}↑"
-                    ),
-                    fg="bright_green",
+                    )
                 ),
-                click.style(f"{t.torrent.ratio:.2f}", fg="bright_yellow"),
+                style.bright_yellow(f"{t.torrent.ratio:.2f}"),
             )
         )
         table.append(
             (
-                click.style(t.site, fg="bright_cyan"),
-                click.style(t.torrent.hash, dim=True)
+                style.bright_cyan(t.site),
+                style.dim(t.torrent.hash)
                 + " ("
-                + click.style(f"{t.torrent.num_complete}↑", fg="bright_green")
+                + style.bright_green(f"{t.torrent.num_complete}↑")
                 + " "
-                + click.style(f"{t.torrent.num_incomplete}↓", fg="cyan")
+                + style.cyan(f"{t.torrent.num_incomplete}↓")
                 + " )",
-                click.style(
+                style.cyan(
                     (
                         f"{S(t.torrent.dlspeed)}/s↓"
                         if speed
                         else f"{S(t.torrent.downloaded)}↓"
-                    ),
-                    fg="cyan",
+                    )
                 ),
-                click.style(f"/ {S(t.torrent.size)}", dim=True),
+                style.dim(f"/ {S(t.torrent.size)}"),
             )
         )
-    click.echo_via_pager(
-        tabulate.tabulate(
-            table, headers=header, maxcolwidths=limits, disable_numparse=True
-        )
-    )
+    click.echo_via_pager(_render_table(table, header, limits))
 
 
-def pretty_rename(pending: list[LocalTorrent]) -> str:
+def pretty_rename(pending: list[LocalTorrent], err: bool = True) -> str:
     if len(pending) == 0:
         return "种子列表为空"
+    style = _styles(err)
     failed, found = [], []
-    arrow = click.style("=>", dim=True)
+    now = time.time()
     for t in pending:
         if t.seed_id == 0:
             failed.append(
                 (
-                    click.style("!!", fg="bright_red"),
-                    click.style(t.torrent.name, fg="bright_red"),
+                    style.mark_failed,
+                    style.bright_red(t.torrent.name),
                     f"{S(t.torrent.size)}",
                     t.torrent.hash[:7],
                 )
             )
             failed.append(
                 (
-                    arrow,
-                    click.style("未能找到匹配", fg="yellow"),
+                    style.arrow,
+                    style.mark_no_match,
                     "",
                     "",
                 )
@@ -232,22 +411,22 @@ def pretty_rename(pending: list[LocalTorrent]) -> str:
         else:
             found.append(
                 (
-                    click.style("✓", fg="bright_green"),
-                    click.style(t.torrent.name, fg="cyan"),
+                    style.mark_found,
+                    style.cyan(t.torrent.name),
                     f"{S(t.torrent.size)}",
                     t.torrent.hash[:7],
                 )
             )
-            info = t.estimate_info()
+            info = t.estimate_info(now)
             found.append(
                 (
-                    arrow,
-                    click.style(info.title, fg="bright_green"),
+                    style.arrow,
+                    style.bright_green(info.title),
                     f"{S(info.file_size)}",
                     info.hash[:7],
                 )
             )
-    return tabulate.tabulate(
+    return _tabulate(
         (*failed, *found), maxcolwidths=[2, 50, 10, 10], disable_numparse=True
     )
 
@@ -256,40 +435,42 @@ def pretty_changes(
     removable: list[LocalTorrent],
     downloadable: list[TorrentInfo],
     duplicates: dict[str, list[LocalTorrent]],
+    err: bool = True,
 ) -> str:
     if len(removable) == 0 and len(downloadable) == 0:
         return "无变更"
+    style = _styles(err)
     all_removable = []
     for t in removable:
         all_removable.append(
             (
-                click.style("删", fg="bright_red"),
-                click.style(f"{t.seed_id}", dim=True),
-                click.style(t.torrent.name, dim=True),
-                click.style(f"-{S(t.torrent.size)}", fg="bright_green"),
+                style.mark_delete,
+                style.dim(f"{t.seed_id}"),
+                style.dim(t.torrent.name),
+                style.bright_green(f"-{S(t.torrent.size)}"),
                 "",
             )
         )
         for dup in duplicates[t.torrent.hash]:
             all_removable.append(
                 (
-                    click.style("同", fg="bright_yellow"),
-                    click.style(f"{dup.seed_id}", dim=True),
-                    click.style(dup.torrent.name, dim=True),
-                    click.style(dup.site, fg="yellow"),
+                    style.mark_duplicate,
+                    style.dim(f"{dup.seed_id}"),
+                    style.dim(dup.torrent.name),
+                    style.yellow(dup.site),
                     "",
                 )
             )
-    return tabulate.tabulate(
+    return _tabulate(
         (
             *all_removable,
             *(
                 (
-                    click.style("新", fg="bright_cyan"),
-                    click.style(f"{t.seed_id}", dim=True),
-                    click.style(t.title, bold=True),
-                    click.style(f"+{S(t.file_size)}", fg="yellow"),
-                    click.style(str(t.promotions), fg="yellow"),
+                    style.mark_new,
+                    style.dim(f"{t.seed_id}"),
+                    style.bold(t.title),
+                    style.yellow(f"+{S(t.file_size)}"),
+                    style.yellow(str(t.promotions)),
                 )
                 for t in downloadable
             ),
@@ -303,36 +484,33 @@ def pretty_scored_torrents(torrents: list[tuple[TorrentInfo, float]]):
     if len(torrents) == 0:
         click.echo("种子列表为空")
         return
+    style = _styles()
     table = []
     header = ["评分", "标题", ""]
     limits = [8, 54, 10]
     for t, score in torrents:
         table.append(
             (
-                click.style(f"{score:.2f}", fg="bright_yellow"),
-                click.style(t.title, bold=True),
-                click.style(f"{S(t.file_size)}", fg="yellow"),
+                style.bright_yellow(f"{score:.2f}"),
+                style.bold(t.title),
+                style.yellow(f"{S(t.file_size)}"),
             )
         )
         table.append(
             (
                 "",
-                click.style(t.sub_title, dim=True)
+                style.dim(t.sub_title)
                 + " ("
-                + click.style(f"{t.seeders}↑", fg="bright_green")
+                + style.bright_green(f"{t.seeders}↑")
                 + " "
-                + click.style(f"{t.leechers}↓", fg="cyan")
+                + style.cyan(f"{t.leechers}↓")
                 + " "
-                + click.style(f"{t.finished}✓", fg="yellow")
+                + style.yellow(f"{t.finished}✓")
                 + " )",
-                click.style(f"{t.live_time:.2f} 天", fg="bright_magenta"),
+                style.bright_magenta(f"{t.live_time:.2f} 天"),
             )
         )
-    click.echo_via_pager(
-        tabulate.tabulate(
-            table, headers=header, maxcolwidths=limits, disable_numparse=True
-        )
-    )
+    click.echo_via_pager(_render_table(table, header, limits))
 
 
 def pretty_comparison(
@@ -351,5 +529,5 @@ def pretty_comparison(
         table.append((r_arrow, filename, f"{S(size)}"))
         table.append((l_arrow, filename, f"{S(remote_files[filename])}"))
     click.echo_via_pager(
-        tabulate.tabulate(table, maxcolwidths=[3, 60, 10], disable_numparse=True)
+        _tabulate(table, maxcolwidths=[3, 60, 10], disable_numparse=True)
     )
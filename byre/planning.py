@@ -20,8 +20,6 @@ import os
 import typing
 from dataclasses import dataclass
 
-import psutil
-
 from byre.clients.data import LocalTorrent, TorrentInfo
 from byre.storage import TorrentStore, TorrentDO
 from byre.utils import S
@@ -53,6 +51,8 @@ class PlannerConfig:
 
     def get_disk_remaining(self):
         """下载目录剩余空间。"""
+        import psutil
+
         remaining = psutil.disk_usage(self.download_dir).free
         return remaining
 
@@ -18,6 +18,7 @@
 
 import math
 import time
+import typing
 from dataclasses import dataclass
 
 from byre.clients.data import (
@@ -29,6 +30,13 @@ from byre.clients.data import (
     LocalTorrent,
 )
 
+#: 各种下载折扣促销对应的权重比例，按优先级排列，只取第一个命中的。
+_DISCOUNTS = (
+    (PROMOTION_FREE, 1.0),
+    (PROMOTION_HALF_DOWN, 0.5),
+    (PROMOTION_THIRTY_DOWN, 0.7),
+)
+
 
 def _piecewise_linear(points: tuple[tuple[float, float], ...], x: float) -> float:
     """分段线性函数。"""
@@ -108,12 +116,7 @@ class Scorer:
         if PROMOTION_TWO_UP in torrent.promotions:
             value *= 2
 
-        discounts = {
-            PROMOTION_FREE: 1.0,
-            PROMOTION_HALF_DOWN: 0.5,
-            PROMOTION_THIRTY_DOWN: 0.7,
-        }
-        for promotion, discount in discounts.items():
+        for promotion, discount in _DISCOUNTS:
             if promotion in torrent.promotions:
                 value *= 1 + self.free_weight * discount
                 break
@@ -130,8 +133,16 @@ class Scorer:
 
         return value
 
-    def score_uploading(self, torrent: LocalTorrent) -> float:
-        """为某个正在上传的种子的价值评分，输出是每天预期的分享率。负分不应被删除。"""
+    def score_uploading(
+        self, torrent: LocalTorrent, now: typing.Optional[float] = None
+    ) -> float:
+        """
+        为某个正在上传的种子的价值评分，输出是每天预期的分享率。负分不应被删除。
+
+        批量评分时可以传入同一个 ``now`` ，省得每个种子都去取一次时间。
+        """
+        if now is None:
+            now = time.time()
         # 不删除正在上传的种子。
         if torrent.torrent.upspeed > 0:
             return -1.0
@@ -141,13 +152,13 @@ class Scorer:
         # 不删除豁免期内的种子。
         if (
             torrent.torrent.completion_on + (self.removal_exemption_days * 24 * 60 * 60)
-            > time.time()
+            > now
         ):
             return -1.0
         # 不删除标记了 keep 的种子。
         if "keep" in torrent.torrent.tags:
             return -1.0
-        info = torrent.estimate_info()
+        info = torrent.estimate_info(now)
         if info.seeders <= 1:
             return -1.0
         return self.score_downloading(info, recovery=False)
@@ -27,10 +27,8 @@ from urllib.parse import urlparse
 
 import appdirs
 import click
-import qbittorrentapi
 import requests
 
-from byre.bt import BtClient
 from byre.setup.byre_config import interactive_configure
 from byre.utils import cast
 
@@ -226,6 +224,10 @@ def setup(config_path: typing.Optional[pathlib.Path] = None, name: str = "byre")
         download(executable)
         user, password, port = _parse_url(config.require(str, "qbittorrent", "url"))
         init_qbittorrent(executable, config_dir, port)
+        import qbittorrentapi
+
+        from byre.bt import BtClient
+
         for _ in range(10):
             time.sleep(1)
             try:
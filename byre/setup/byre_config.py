@@ -21,7 +21,6 @@ import typing
 
 import click
 
-from byre.bt import BtClient
 from byre.clients import SITES, CLIENTS
 from byre.clients.api import NexusApi
 from byre.clients.client import NexusClient
@@ -82,6 +81,8 @@ def _prompt_qbittorrent():
         )
         url = f"{proto}://{username}:{password}@{host}:{port}"
         if not download:
+            from byre.bt import BtClient
+
             try:
                 BtClient(url).list_torrents([])
             except Exception as e:
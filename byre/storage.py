@@ -21,11 +21,12 @@ import sqlite3
 import typing
 from dataclasses import dataclass
 
-import bencoder
-
 from byre.clients.data import LocalTorrent, TorrentInfo
 from byre.utils import cast
 
+if typing.TYPE_CHECKING:
+    import bencoder
+
 _logger = logging.getLogger("byre.storage")
 _warning = _logger.warning
 
@@ -194,6 +195,8 @@ class TorrentStore:
 
     @classmethod
     def decode_torrent_file(cls, content: bytes) -> tuple[str, dict[str, int]]:
+        import bencoder
+
         torrent = bencoder.bdecode(content)
         info = torrent[b"info"]
         root = cast(bytes, info[b"name"]).decode()
@@ -210,7 +213,9 @@ class TorrentStore:
         return cls.hash_info(info), paths
 
     @classmethod
-    def hash_info(cls, info: bencoder.OrderedDict) -> str:
+    def hash_info(cls, info: "bencoder.OrderedDict") -> str:
+        import bencoder
+
         return hashlib.sha1(bencoder.bencode(info)).hexdigest().lower()
 
     @classmethod
@@ -139,12 +139,18 @@ class S:
         if format_spec is not None and len(format_spec) > 0:
             raise ValueError("不支持的格式")
 
-        for i, unit in enumerate(("B", "KiB", "MiB", "GiB", "TiB", "PiB")):
-            if self.size < 1024 ** (i + 1):
-                return f"{self.size / 1024 ** i:.2f} {unit}"
+        for unit, scale in _SIZE_UNITS:
+            if self.size < scale * 1024:
+                return f"{self.size / scale:.2f} {unit}"
         return "超大"
 
 
+#: 显示文件大小用的单位以及对应的字节数。
+_SIZE_UNITS = tuple(
+    (unit, 1024**i) for i, unit in enumerate(("B", "KiB", "MiB", "GiB", "TiB", "PiB"))
+)
+
+
 T = typing.TypeVar("T")
 
 
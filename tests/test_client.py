@@ -13,10 +13,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import os
+import pickle
 import shutil
 import tempfile
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
 from byre.clients.byr import *
 # noinspection PyUnresolvedReferences
@@ -93,5 +98,93 @@ class TestByrClient(unittest.TestCase):
         shutil.rmtree(path)
 
 
+class RateLimitTestCase(unittest.TestCase):
+    def test_token_bucket(self):
+        path = tempfile.mkdtemp()
+        client = ByrClient("", "", cookie_file=os.path.join(path, "byr.cookies"), request_frequency=2.0)
+        with mock.patch("byre.clients.client.time.sleep") as sleep:
+            # 桶满的时候允许连续发起两个请求。
+            client._rate_limit()
+            client._rate_limit()
+            sleep.assert_not_called()
+            client._rate_limit()
+            sleep.assert_called_once()
+            self.assertLessEqual(sleep.call_args[0][0], 0.5 * 1.1)
+        client.close()
+        shutil.rmtree(path)
+
+
+class SessionRenewalTestCase(unittest.TestCase):
+    def test_concurrent_relogin(self):
+        path = tempfile.mkdtemp()
+        client = ByrClient("someone", "", cookie_file=os.path.join(path, "byr.cookies"),
+                           request_frequency=100.0)
+        threads = 4
+        # 所有线程都先拿到重定向（也就是过期的会话），再去抢着重新登录。
+        barrier = threading.Barrier(threads)
+
+        def get(url, allow_redirects):
+            if client._session.cookies.get("session") == "new":
+                return mock.Mock(status_code=200, is_redirect=False)
+            barrier.wait(timeout=5)
+            return mock.Mock(status_code=302, is_redirect=True, headers={})
+
+        def authorize():
+            client._session.cookies.clear()
+            client._session.cookies.set("session", "new")
+
+        with mock.patch.object(client._session, "get", side_effect=get), \
+                mock.patch.object(client, "_authorize_session", side_effect=authorize) as login:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                results = list(executor.map(lambda _: client.get("index.php"), range(threads)))
+            login.assert_called_once()
+        self.assertTrue(all(res.status_code == 200 for res in results))
+        client.close()
+        shutil.rmtree(path)
+
+
+class CookieCacheTestCase(unittest.TestCase):
+    def test_json_cache(self):
+        path = tempfile.mkdtemp()
+        cookie_file = os.path.join(path, "dir", "byr.cookies")
+        client = ByrClient("someone", "", cookie_file=cookie_file)
+        client._session.cookies.set("session", "value")
+        client._cache_session()
+        client.close()
+        with open(cookie_file, encoding="utf-8") as file:
+            self.assertEqual({"session": "value"}, json.load(file)["cookies"])
+
+        client = ByrClient("someone", "", cookie_file=cookie_file)
+        self.assertEqual("value", client._session.cookies.get("session"))
+        client.close()
+
+        client = ByrClient("another", "", cookie_file=cookie_file)
+        self.assertFalse(client._update_session_from_cache())
+        client.close()
+        shutil.rmtree(path)
+
+    def test_legacy_pickle_cache(self):
+        # 旧版本的 pickle 缓存不再反序列化，当作没有缓存。
+        path = tempfile.mkdtemp()
+        cookie_file = os.path.join(path, "byr.cookies")
+        with open(cookie_file, "wb") as file:
+            pickle.dump({"username": "someone", "cookies": {"session": "value"}}, file)
+        client = ByrClient("someone", "", cookie_file=cookie_file)
+        self.assertIsNone(client._session.cookies.get("session"))
+        self.assertFalse(client._update_session_from_cache())
+        client.close()
+        shutil.rmtree(path)
+
+    def test_corrupt_cache(self):
+        path = tempfile.mkdtemp()
+        cookie_file = os.path.join(path, "byr.cookies")
+        with open(cookie_file, "w", encoding="utf-8") as file:
+            file.write('{"username": "someone", "coo')
+        client = ByrClient("someone", "", cookie_file=cookie_file)
+        self.assertFalse(client._update_session_from_cache())
+        client.close()
+        shutil.rmtree(path)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,150 @@
+#  Copyright (C) 2023 Yesh
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import click
+from click.testing import CliRunner
+
+# noinspection PyUnresolvedReferences
+import context
+from byre.commands.config import ConfigurableGroup, GlobalConfig
+
+_CONFIG = """
+[byr]
+username = "someone"
+
+[planning.disk]
+download_dir = "/tmp"
+max_total_size = "1 TiB"
+"""
+
+
+def load_config(content: str = _CONFIG) -> GlobalConfig:
+    path = tempfile.mkdtemp()
+    file = os.path.join(path, "byre.toml")
+    with open(file, "w", encoding="utf-8") as f:
+        f.write(content)
+    config = GlobalConfig().load(file)
+    shutil.rmtree(path)
+    return config
+
+
+class GlobalConfigTestCase(unittest.TestCase):
+    def test_nested_lookup(self):
+        config = load_config()
+        self.assertEqual("someone", config.require(str, "byr", "username"))
+        self.assertEqual("/tmp", config.require(str, "planning", "disk", "download_dir"))
+        # 中间的表本身也能取到。
+        self.assertEqual(["disk"], list(config.require(dict, "planning").keys()))
+        self.assertEqual("1 TiB", config.optional(str, "0", "planning", "disk", "max_total_size"))
+
+    def test_missing(self):
+        config = load_config()
+        self.assertEqual("0", config.optional(str, "0", "planning", "disk", "max_download_size"))
+        self.assertEqual("0", config.optional(str, "0", "planning", "other", "download_dir"))
+        # 不能越过非表的值继续往下找。
+        self.assertEqual("0", config.optional(str, "0", "byr", "username", "x"))
+        with self.assertRaises(ValueError):
+            config.require(str, "qbittorrent", "url")
+        with self.assertRaises(RuntimeError):
+            GlobalConfig().optional(str, "0", "byr", "username")
+
+    def test_password_from_env(self):
+        config = load_config()
+        with mock.patch.dict(os.environ, {"BYRE_BYR_PASSWORD": "secret"}), \
+                mock.patch("byre.commands.config.click.prompt") as prompt:
+            self.assertEqual("secret", config.require(str, "byr", "password", password=True))
+            prompt.assert_not_called()
+
+    def test_password_env_name(self):
+        config = load_config()
+        # 非单词字符都换成下划线。
+        with mock.patch.dict(os.environ, {"BYRE_QBITTORRENT_WEB_UI_PASS": "secret"}), \
+                mock.patch("byre.commands.config.click.prompt") as prompt:
+            self.assertEqual(
+                "secret", config.require(str, "qbittorrent", "web-ui.pass", password=True)
+            )
+            prompt.assert_not_called()
+
+    def test_password_prompted_once(self):
+        config = load_config()
+        env = {k: v for k, v in os.environ.items() if k != "BYRE_BYR_PASSWORD"}
+        with mock.patch.dict(os.environ, env, clear=True), \
+                mock.patch("byre.commands.config.click.prompt", return_value="typed") as prompt:
+            self.assertEqual("typed", config.require(str, "byr", "password", password=True))
+            self.assertEqual("typed", config.require(str, "byr", "password", password=True))
+            prompt.assert_called_once()
+        # 不是密码的话缺失就直接报错，不会询问。
+        with self.assertRaises(ValueError):
+            config.require(str, "tju", "password")
+
+
+class _Base(ConfigurableGroup):
+    def __init__(self, name: str):
+        super().__init__(name=name)
+        self.calls = []
+
+    def configure(self, config):
+        pass
+
+    @click.command
+    def hello(self):
+        self.calls.append(("base", self))
+
+    @click.command
+    def bye(self):
+        self.calls.append(("bye", self))
+
+    @click.command
+    def hidden(self):
+        pass
+
+
+class _Child(_Base):
+    @click.command(name="hello")
+    def hello(self):
+        self.calls.append(("child", self))
+
+    # 子类里不是命令的同名属性会把父类的命令去掉。
+    hidden = None
+
+
+class ConfigurableGroupTestCase(unittest.TestCase):
+    def test_override_and_binding(self):
+        root = click.Group()
+        base = _Base("base").register(root)
+        child = _Child("child").register(root)
+        self.assertEqual({"hello", "bye", "hidden"}, set(base.commands))
+        self.assertEqual({"hello", "bye"}, set(child.commands))
+
+        runner = CliRunner()
+        for args in (["base", "hello"], ["child", "hello"], ["child", "bye"]):
+            result = runner.invoke(root, args, obj={"config": None})
+            self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual([("base", base)], base.calls)
+        self.assertEqual([("child", child), ("bye", child)], child.calls)
+        # 类上的命令本身没有被改动，绑定的是复制出来的命令。
+        self.assertIsNot(_Base.bye, child.commands["bye"])
+        self.assertNotIsInstance(_Base.bye.callback, functools.partial)
+
+
+if __name__ == "__main__":
+    unittest.main()
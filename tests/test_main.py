@@ -0,0 +1,302 @@
+#  Copyright (C) 2023 Yesh
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import bisect
+import copy
+import re
+import types
+import typing
+import unittest
+from unittest import mock
+
+import bencoder
+
+# noinspection PyUnresolvedReferences
+import context
+from byre.clients.data import (
+    LocalTorrent,
+    NexusUser,
+    TorrentInfo,
+    TorrentPromotion,
+    TorrentTag,
+    TypedTorrent,
+)
+from byre.clients.api import NexusSortableField
+from byre.commands.main import MainCommand
+
+GiB = 1024 ** 3
+
+
+def remote_torrent(seed_id: int, title: str, size: float, hs: str = "", site: str = "byr"):
+    return TorrentInfo(
+        site=site,
+        title=title,
+        sub_title="",
+        seed_id=seed_id,
+        cat="",
+        category="",
+        second_category="",
+        promotions=TorrentPromotion.NONE,
+        tag=TorrentTag.ANY,
+        file_size=size,
+        live_time=0.0,
+        seeders=0,
+        leechers=0,
+        finished=0,
+        comments=0,
+        uploader=NexusUser(site),
+        uploaded=0.0,
+        downloaded=0.0,
+        ratio=0.0,
+        hash=hs,
+    )
+
+
+def local_torrent(name: str, size: int, hs: str, total_size: int = 0,
+                  site: str = "byr", seed_id: int = 0, amount_left: int = 0,
+                  files: typing.Optional[dict[str, int]] = None):
+    torrent = mock.Mock(
+        size=size,
+        total_size=total_size or size,
+        hash=hs,
+        amount_left=amount_left,
+        files=[types.SimpleNamespace(name=k, size=v) for k, v in (files or {}).items()],
+    )
+    torrent.name = name
+    return LocalTorrent(TypedTorrent(torrent), seed_id, site, None)
+
+
+def torrent_file(root: str, files: dict[str, int]) -> bytes:
+    """生成只有文件列表的种子文件，``files`` 的键是不带根目录的相对路径。"""
+    if list(files.keys()) == [""]:
+        info = {b"name": root.encode(), b"length": files[""]}
+    else:
+        info = {
+            b"name": root.encode(),
+            b"files": [
+                {b"path": [seg.encode() for seg in path.split("/")], b"length": size}
+                for path, size in files.items()
+            ],
+        }
+    return bencoder.bencode({b"info": info})
+
+
+class MayBeSameTestCase(unittest.TestCase):
+    def test_hash(self):
+        local = local_torrent("Some.Show.S01", 10 * GiB, "aaaa")
+        self.assertTrue(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 1.0, "aaaa")))
+        # 哈希值不同的话大小对得上也不行。
+        self.assertFalse(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 10 * GiB, "bbbb")))
+
+    def test_unknown_size(self):
+        local = local_torrent("Some.Show.S01", 10 * GiB, "aaaa")
+        self.assertTrue(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 0)))
+
+    def test_size_window(self):
+        local = local_torrent("Some.Show.S01", 10 * GiB, "aaaa")
+        self.assertTrue(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 10.05 * GiB)))
+        self.assertTrue(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 9.95 * GiB)))
+        self.assertFalse(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 10.2 * GiB)))
+        self.assertFalse(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 9.8 * GiB)))
+
+    def test_partially_selected(self):
+        # 只选了部分文件下载的话，按种子的总大小比较。
+        local = local_torrent("Some.Show.S01", 2 * GiB, "aaaa", total_size=10 * GiB)
+        self.assertTrue(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 10 * GiB)))
+        self.assertFalse(MainCommand._may_be_same(local, remote_torrent(1, "Some Show", 2 * GiB)))
+
+
+def words(name: str) -> set[str]:
+    return set(s.lower() for s in re.split("[\\d -@\\[-`{-~]", name) if len(s) > 3)
+
+
+def baseline_match(pending: list[LocalTorrent], remote: list[TorrentInfo],
+                   details: dict[int, TorrentInfo]):
+    """改写前 `MainCommand._match_against_remote` 的逐一比较算法，用来对照结果。"""
+    for local in pending:
+        if local.seed_id != 0:
+            continue
+        for torrent in remote:
+            if len(words(torrent.title) & words(local.torrent.name)) == 0:
+                continue
+            info = details[torrent.seed_id]
+            if local.torrent.hash == info.hash:
+                local.seed_id = torrent.seed_id
+                local.info = info
+                break
+
+
+class MatchAgainstRemoteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pending = [
+            local_torrent("Movie.Alpha.2020.1080p", 10 * GiB, "hash-a"),
+            local_torrent("Series.Bravo.S01", 5 * GiB, "hash-b"),
+            local_torrent("Unmatched.Charlie", 3 * GiB, "hash-c"),
+            local_torrent("Already.Alpha.Named", 10 * GiB, "hash-d", seed_id=9),
+        ]
+        self.remote = [
+            # 关键词和大小都对得上，但哈希值不对。
+            remote_torrent(2, "Alpha Other Cut", 10 * GiB),
+            # 列表里没有哈希值，需要抓详情。
+            remote_torrent(1, "Movie Alpha 2020", 10 * GiB),
+            # 列表里已经带了哈希值。
+            remote_torrent(3, "Series Bravo", 5 * GiB, "hash-b"),
+            # 关键词对得上但大小差得远。
+            remote_torrent(4, "Bravo Extras", 1 * GiB),
+            remote_torrent(5, "Charlie Something", 3 * GiB),
+        ]
+        self.details = {
+            1: remote_torrent(1, "Movie Alpha 2020", 10 * GiB, "hash-a"),
+            2: remote_torrent(2, "Alpha Other Cut", 10 * GiB, "hash-x"),
+            3: remote_torrent(3, "Series Bravo", 5 * GiB, "hash-b"),
+            4: remote_torrent(4, "Bravo Extras", 1 * GiB, "hash-y"),
+            5: remote_torrent(5, "Charlie Something", 3 * GiB, "hash-z"),
+        }
+
+    def _command(self):
+        byr = mock.Mock()
+        byr.api.torrent.side_effect = lambda seed_id: self.details[seed_id]
+        return MainCommand(mock.Mock(), byr), byr.api
+
+    def test_matches(self):
+        command, api = self._command()
+        infos: dict[int, TorrentInfo] = {}
+        command._match_against_remote(self.pending, self.remote, infos)
+        self.assertEqual([1, 3, 0, 9], [t.seed_id for t in self.pending])
+        self.assertEqual("hash-a", self.pending[0].info.hash)
+        # 带了哈希值的、大小对不上的都不用抓详情，每个种子最多抓一次。
+        fetched = sorted(c.args[0] for c in api.torrent.call_args_list)
+        self.assertEqual([1, 2, 5], fetched)
+
+    def test_same_as_baseline(self):
+        expected = copy.deepcopy(self.pending)
+        baseline_match(expected, self.remote, self.details)
+        command, _ = self._command()
+        command._match_against_remote(self.pending, self.remote, {})
+        self.assertEqual([t.seed_id for t in expected], [t.seed_id for t in self.pending])
+        self.assertEqual([t.info for t in expected], [t.info for t in self.pending])
+
+    def test_details_shared_across_lists(self):
+        command, api = self._command()
+        infos: dict[int, TorrentInfo] = {}
+        command._match_against_remote(self.pending[2:3], self.remote, infos)
+        command._match_against_remote(self.pending[2:3], self.remote, infos)
+        api.torrent.assert_called_once_with(5)
+
+
+def baseline_hitchhike(byr_torrents: list[LocalTorrent], existing: dict[str, set[int]],
+                       pages: dict[str, list[TorrentInfo]], contents: dict[int, bytes]):
+    """改写前 `MainCommand.hitchhike` 的匹配算法：逐个站点、逐个种子地查找、下载、比较。"""
+    byr_torrents = sorted(byr_torrents, key=lambda t: t.torrent.size)
+    sizes = [t.torrent.size for t in byr_torrents]
+    matches = []
+    for site, page in pages.items():
+        for torrent in sorted(page, key=lambda t: t.file_size):
+            if torrent.seed_id in existing[site]:
+                continue
+            i = bisect.bisect_left(sizes, 0.99 * torrent.file_size)
+            for local in byr_torrents[i:]:
+                if 1.01 * torrent.file_size < local.torrent.size:
+                    break
+                if len(words(local.torrent.name) & words(torrent.title)) == 0:
+                    continue
+                content = contents[torrent.seed_id]
+                if MainCommand._torrent_files_exact_match(local, content, torrent):
+                    matches.append((local, torrent, content))
+    return matches
+
+
+class HitchhikeTestCase(unittest.TestCase):
+    def setUp(self):
+        alpha = {"Movie.Alpha.2020.mkv": 10 * GiB}
+        bravo = {"Series.Bravo.S01/E01.mkv": 2 * GiB, "Series.Bravo.S01/E02.mkv": 3 * GiB}
+        self.byr_torrents = [
+            local_torrent("Series.Bravo.S01", 5 * GiB, "hash-b", files=bravo),
+            local_torrent("Movie.Alpha.2020.mkv", 10 * GiB, "hash-a", files=alpha),
+            local_torrent("Charlie.Doc", 3 * GiB, "hash-c", files={"Charlie.Doc/a.mkv": 3 * GiB}),
+        ]
+        self.local = [
+            *self.byr_torrents,
+            # 还没下载完的不参与匹配。
+            local_torrent("Delta.Alpha", 10 * GiB, "hash-d", amount_left=1,
+                          files={"Delta.Alpha.mkv": 10 * GiB}),
+            local_torrent("Series.Bravo.S01", 5 * GiB, "hash-e", site="tju", seed_id=7),
+        ]
+        alpha_remote = remote_torrent(1, "Movie Alpha 2020", 10.02 * GiB, site="tju")
+        self.lists = {
+            NexusSortableField.ID: [
+                alpha_remote,
+                # 本地已经有了。
+                remote_torrent(7, "Series Bravo S01", 5 * GiB, site="tju"),
+            ],
+            NexusSortableField.LEECHER_COUNT: [
+                remote_torrent(2, "Series Bravo S01 Complete", 5 * GiB, site="tju"),
+                # 关键词、大小都对得上，但文件不一样。
+                remote_torrent(3, "Charlie Doc", 3 * GiB, site="tju"),
+            ],
+            NexusSortableField.SEEDER_COUNT: [
+                alpha_remote,
+                remote_torrent(4, "Alpha Unrelated", 20 * GiB, site="tju"),
+            ],
+        }
+        self.contents = {
+            1: torrent_file("Movie.Alpha.2020.mkv", {"": 10 * GiB}),
+            2: torrent_file("Series.Bravo.S01", {"E01.mkv": 2 * GiB, "E02.mkv": 3 * GiB}),
+            3: torrent_file("Charlie.Doc", {"b.mkv": 3 * GiB}),
+            4: torrent_file("Alpha.Unrelated", {"": 20 * GiB}),
+            7: torrent_file("Series.Bravo.S01", {"E01.mkv": 2 * GiB, "E02.mkv": 3 * GiB}),
+        }
+
+        tju = mock.Mock()
+        tju.api_cls.site.return_value = "tju"
+        tju.api.list_torrents.side_effect = lambda page, sorted_by: list(self.lists[sorted_by])
+        tju.api.download_torrent.side_effect = lambda seed_id: self.contents[seed_id]
+        self.tju = tju
+        self.bt = mock.Mock()
+        self.bt.api.list_torrents.return_value = self.local
+        self.command = MainCommand(self.bt, mock.Mock(), tju)
+        self.command._config = mock.Mock()
+
+    def test_same_as_baseline(self):
+        pages = {"tju": [t for torrents in self.lists.values() for t in torrents]}
+        with mock.patch("byre.commands.main.pretty.pretty_comparison"):
+            expected = baseline_hitchhike(self.byr_torrents, {"tju": {7}}, pages, self.contents)
+            self.command.hitchhike.callback(self.command, dry_run=False)
+        added = [
+            (c.kwargs["exists"], c.args[1], c.args[0]) for c in self.bt.api.add_torrent.call_args_list
+        ]
+        self.assertEqual(
+            [(local.torrent.name, torrent.seed_id) for local, torrent, _ in expected],
+            [(local.torrent.name, torrent.seed_id) for local, torrent, _ in added],
+        )
+        self.assertEqual(
+            {("Movie.Alpha.2020.mkv", 1), ("Series.Bravo.S01", 2)},
+            {(local.torrent.name, torrent.seed_id) for local, torrent, _ in added},
+        )
+        self.assertTrue(all(content == self.contents[t.seed_id] for _, t, content in added))
+
+    def test_downloads_once(self):
+        with mock.patch("byre.commands.main.pretty.pretty_comparison"):
+            self.command.hitchhike.callback(self.command, dry_run=True)
+        self.bt.api.add_torrent.assert_not_called()
+        downloaded = sorted(c.args[0] for c in self.tju.api.download_torrent.call_args_list)
+        # 同一个种子出现在多个列表里也只下载一次，已有的、关键词不匹配的不下载。
+        self.assertEqual([1, 2, 3], downloaded)
+        # 三种排序的列表各抓一次。
+        self.assertEqual(3, self.tju.api.list_torrents.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
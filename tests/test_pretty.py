@@ -0,0 +1,107 @@
+#  Copyright (C) 2023 Yesh
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU Affero General Public License as
+#  published by the Free Software Foundation, either version 3 of the
+#  License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import textwrap
+import unittest
+from unittest import mock
+
+import click
+
+# noinspection PyUnresolvedReferences
+import context
+from byre.commands.pretty import (
+    _display_width,
+    _render_table,
+    _styles,
+    _wrap_cell,
+    pretty_rename,
+)
+
+
+class WrapCellTestCase(unittest.TestCase):
+    def test_word_wrap(self):
+        text = "The Quick Brown Fox 2023 1080p WEB-DL"
+        for limit in range(4, 40):
+            # textwrap 偶尔会在行尾留一个空格，表格里反正看不出来。
+            expected = textwrap.wrap(text, limit, break_on_hyphens=False)
+            self.assertEqual([line.rstrip() for line in expected], _wrap_cell(text, limit))
+        self.assertEqual(["abcd", "efgh", "i j"], _wrap_cell("abcdefghi j", 4))
+        self.assertEqual(["a", "b"], _wrap_cell("a\nb", 10))
+        self.assertEqual([""], _wrap_cell("", 10))
+
+    def test_cjk_width(self):
+        self.assertEqual(["中文标", "题很长", "的名字"], _wrap_cell("中文标题很长的名字", 6))
+        self.assertEqual(["中文", "标题"], _wrap_cell("中文标题", 5))
+        # 比一行还宽的字符也至少占一行。
+        self.assertEqual(["中", "文"], _wrap_cell("中文", 1))
+
+    def test_ansi_across_wrap(self):
+        reset = "\x1b[0m"
+        bold = click.style("abcdefghij", bold=True)
+        lines = _wrap_cell(bold, 4)
+        self.assertEqual(["abcd", "efgh", "ij"], [click.unstyle(line) for line in lines])
+        for line in lines:
+            self.assertTrue(line.startswith("\x1b[1m"))
+            self.assertTrue(line.endswith(reset))
+
+        lines = _wrap_cell("ab " + click.style("cd ef", fg="red") + " gh", 5)
+        self.assertEqual(["ab \x1b[31mcd" + reset, "\x1b[31mef" + reset + " gh"], lines)
+
+
+class RenderTableTestCase(unittest.TestCase):
+    def test_column_limits(self):
+        table = _render_table(
+            [(1, "中文标题很长的名字 abc", click.style("1.00 GiB", fg="yellow"))],
+            ["ID", "标题", ""],
+            [8, 6, 10],
+        )
+        lines = table.split("\n")
+        self.assertEqual("ID  标题", lines[0])
+        self.assertEqual("--  ------  --------", lines[1])
+        self.assertEqual(["1   中文标  1.00 GiB", "    题很长", "    的名字", "    abc"],
+                         [click.unstyle(line) for line in lines[2:]])
+        for line in lines:
+            self.assertLessEqual(_display_width(line), 2 + 2 + 6 + 2 + 8)
+
+
+class _Terminal(io.StringIO):
+    def isatty(self) -> bool:
+        return True
+
+
+class StylesTestCase(unittest.TestCase):
+    def test_decided_at_call_time(self):
+        with mock.patch("sys.stdout", io.StringIO()):
+            self.assertEqual("text", _styles().bold("text"))
+        with mock.patch("sys.stdout", _Terminal()):
+            self.assertEqual(click.style("text", bold=True), _styles().bold("text"))
+        with mock.patch("sys.stdout", _Terminal()), mock.patch("sys.stderr", io.StringIO()):
+            self.assertEqual("=>", _styles(err=True).arrow)
+
+    def test_markers_unstyled_when_piped(self):
+        local = mock.Mock(seed_id=0)
+        local.torrent.name = "Some.Torrent.2023"
+        local.torrent.size = 1024
+        local.torrent.hash = "0123456789abcdef"
+        with mock.patch("sys.stderr", io.StringIO()):
+            output = pretty_rename([local])
+        self.assertNotIn("\x1b", output)
+        self.assertIn("!!", output)
+        self.assertIn("未能找到匹配", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
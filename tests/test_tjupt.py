@@ -13,11 +13,14 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import datetime
 import os
 import shutil
 import tempfile
 import unittest
 
+import bs4
+
 # noinspection PyUnresolvedReferences
 import context
 from byre.clients.data import UserTorrentKind
@@ -82,5 +85,21 @@ class TjuPtClientTestCase(unittest.TestCase):
         shutil.rmtree(path)
 
 
+
+class TjuPtPageParsingTestCase(unittest.TestCase):
+    def test_upload_time(self):
+        for text, expected in [
+            ("2023-04-01 12:30:45", datetime.datetime(2023, 4, 1, 12, 30, 45)),
+            # 没有秒数的时间也要能解析。
+            ("2023-04-01 12:30", datetime.datetime(2023, 4, 1, 12, 30)),
+        ]:
+            page = bs4.BeautifulSoup(
+                '<table class="embedded"><table><tr><td>种子名称</td>'
+                f"<td>某种子 发布于 {text} 由某人</td></tr></table></table>",
+                "html.parser",
+            )
+            self.assertEqual(expected, TjuPtApi._extract_page_upload_time(page))
+
+
 if __name__ == '__main__':
     unittest.main()